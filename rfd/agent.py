@@ -4,7 +4,8 @@ from math import exp
 from pickle import dump
 from random import choice, random
 
-from rfd.search import Map
+from rfd import archive, timing, trace
+from rfd.search import Map, HierarchicalMap
 from rfd.theory import Theory
 from rfd.qfunction import QFunction
 
@@ -23,13 +24,16 @@ EPSILON_DECAY = 0.99  # Decrease in exploration rate
 
 
 class Agent(object):
-    def __init__(self, extend_theory=True, extend_map=True):
+    horizon = None  # Distance beyond which threats are ignored, for agents saved without one
+
+    def __init__(self, extend_theory=True, extend_map=True, horizon=None, clusters=None):
         self.extend_theory = extend_theory
         self.extend_map = extend_map
+        self.horizon = horizon
 
-        # Knowledge base
+        # Knowledge base, with regions grouped into clusters of the given size for large maps
         self.theory = Theory()
-        self.map = Map()
+        self.map = Map() if clusters is None else HierarchicalMap(clusters)
 
         # Policy collection
         self.routes = dict()
@@ -38,13 +42,18 @@ class Agent(object):
 
     def observe(self, record):
         """Watch a demonstration and construct knowledge accordingly."""
-        for frame in record:
-            self.theory.update(frame)
-            self.map.update(frame)
+        self.theory.observe(record)
+        self.map.observe(record)
+
+    def adopt(self, evidence, passages):
+        """Construct knowledge from summaries of demonstrations, as watching them would."""
+        self.theory.adopt(evidence)
+        self.map.adopt(passages)
 
     def save(self, filename):
-        """Save this agent for later use."""
+        """Save this agent for later use, in sections that load on demand if the filename ends in .rfd."""
         self.prepare()
+        data = archive.pack(self) if filename.endswith(archive.SUFFIX) else None  # Before opening truncates a file its tables may be mapped from
         try:
             f = open(filename, "wb")
         except FileNotFoundError:
@@ -52,7 +61,10 @@ class Agent(object):
             self.save(filename)
             return
         try:
-            dump(self, f)
+            if data is None:
+                dump(self, f)
+            else:
+                f.write(data)
         except MemoryError:
             print("MemoryError while trying to save", filename)
         f.close()
@@ -64,24 +76,62 @@ class Agent(object):
         self.checkpoint = None
         self.antiobjectives = set()
 
+        # Short-term data for tasks attempted in lockstep
+        self.batch_actions = list()
+        self.batch_objectives = list()
+        self.batch_checkpoints = list()
+        self.batch_antiobjectives = list()
+
         # Reset risk weights
         for policy in self.routes.values():
             policy.beta = BETA_MAX
         for policy in self.tactics.values():
             policy.beta = BETA_MAX
 
+    def prepare_many(self, n):
+        """Reset short-term data before attempting the given number of tasks in lockstep."""
+        self.prepare()
+        self.batch_actions = [None] * n
+        self.batch_objectives = [None] * n
+        self.batch_checkpoints = [None] * n
+        self.batch_antiobjectives = [set() for i in range(n)]
+
     def attempt(self, task):
         """Try to complete the given task."""
         self.prepare()
+        if trace.sink is not None:
+            trace.sink.begin()
         while not task.ended():
-            task.perform(self.act(task))
+            action = self.act(task)
+            start = timing.clock()
+            task.perform(action)
+            start = timing.lap("perform", start)
             task.update()
+            timing.lap("task.update", start)
             self.update(task)
             if len(task.record) > LIMIT:
                 break
 
+    def attempt_many(self, tasks):
+        """Try to complete the given tasks in lockstep, sharing knowledge and policies among them."""
+        self.prepare_many(len(tasks))
+        if trace.sink is not None:
+            trace.sink.begin(len(tasks))
+        live = [i for i, task in enumerate(tasks) if not task.ended()]
+        while len(live) > 0:
+            actions = self.act_many(tasks, live)
+            start = timing.clock()
+            type(tasks[live[0]]).perform_all([tasks[i] for i in live], actions)
+            start = timing.lap("perform", start)
+            for i in live:
+                tasks[i].update()
+            timing.lap("task.update", start)
+            self.update_many(tasks, live)
+            live = [i for i in live if not tasks[i].ended() and len(tasks[i].record) <= LIMIT]
+
     def act(self, task, verbose=False):
         """Choose an action in the given task."""
+        start = timing.clock()
         actions = task.actions()
 
         # Choose an objective
@@ -96,55 +146,100 @@ class Agent(object):
             else:
                 print("Objective:", str(self.objective), "via", self.checkpoint.subject.region)
 
-        # Deploy a policy
-        if self.checkpoint is not None:
-            policy = self.routes[self.checkpoint.template]
-            rewards = {a: policy.Q(self.checkpoint.s, a) for a in actions}
-            epsilon = policy.epsilon
-        elif self.objective is not None:
-            policy = self.tactics[self.objective.template]
-            rewards = {a: policy.Q(self.objective.s, a) for a in actions}
-            epsilon = policy.epsilon
-        else:
-            epsilon = 1.0
+        self.action = self.choose(actions, self.objective, self.checkpoint, self.antiobjectives)
+        timing.lap("Agent.act", start)
+        return self.action
 
-        # Evaluate risks
-        risks = {a: 0 for a in actions}
-        for a in actions:
-            for objective in self.antiobjectives:
-                risks[a] -= self.reflexes[objective.template].Q(objective.s, a)
+    def act_many(self, tasks, live):
+        """Choose an action in each of the tasks at the given positions, sharing work among them."""
+        start = timing.clock()
+        failures = self.theory.causes("FAILURE")
+        contributors = dict()  # By object type signature
+        actions = list()
+
+        for i in live:
+            task = tasks[i]
+            if task.ended():
+                templates = set()
+            else:
+                signature = Agent.signature(task.frame)
+                if signature not in contributors:
+                    contributors[signature] = self.theory.contributors("SUCCESS", task.frame)
+                templates = contributors[signature]
+
+            objective, checkpoint, antiobjectives = self.plan(task, failures, templates)
+            self.batch_objectives[i] = objective
+            self.batch_checkpoints[i] = checkpoint
+            self.batch_antiobjectives[i] = antiobjectives
+            self.batch_actions[i] = self.choose(task.actions(), objective, checkpoint, antiobjectives)
+            actions.append(self.batch_actions[i])
+
+        timing.lap("Agent.act", start)
+        return actions
+
+    def choose(self, actions, objective, checkpoint, antiobjectives):
+        """Choose one of the given actions in pursuit of the given objective and checkpoint, avoiding the antiobjectives."""
+        actions = list(actions)
+        policy, rewards, risks = self.evaluate(actions, objective, checkpoint, antiobjectives)
+        epsilon = 1.0 if policy is None else policy.epsilon
 
         # Choose an action
         if random() < epsilon:
             safest = min(risks.values())
-            self.action = choice([a for a in actions if risks[a] <= safest])
+            return choice([a for a in actions if risks[a] <= safest])
         else:
             values = {a: rewards[a] - policy.beta * risks[a] for a in actions}
             best = max(values[a] for a in actions)
-            self.action = choice([a for a in actions if values[a] >= best])
             policy.beta = policy.beta * BETA_DECAY
+            return choice([a for a in actions if values[a] >= best])
 
-        return self.action
+    def evaluate(self, actions, objective, checkpoint, antiobjectives):
+        """Return the policy deployed for the given objective and checkpoint, if any, with the value and risk of each of the given actions."""
+
+        # Deploy a policy
+        policy = None
+        rewards = {a: 0 for a in actions}
+        if checkpoint is not None:
+            policy = self.routes[checkpoint.template]
+            rewards = dict(zip(actions, policy.values(checkpoint.s, actions)))
+        elif objective is not None:
+            policy = self.tactics[objective.template]
+            rewards = dict(zip(actions, policy.values(objective.s, actions)))
+
+        # Evaluate risks
+        risks = {a: 0 for a in actions}
+        for objective in antiobjectives:
+            for a, value in zip(actions, self.reflexes[objective.template].values(objective.s, actions)):
+                risks[a] -= value
+
+        return policy, rewards, risks
 
     def strategize(self, task):
         """Choose an objective in the given task."""
-        self.checkpoint = None
-        self.objective = None
+        start = timing.clock()
+        failures = self.theory.causes("FAILURE")
+        contributors = set() if task.ended() else self.theory.contributors("SUCCESS", task.frame)
+        self.objective, self.checkpoint, self.antiobjectives = self.plan(task, failures, contributors)
+        timing.lap("Agent.strategize", start)
+
+    def plan(self, task, failures, contributors):
+        """Return an objective, checkpoint and antiobjectives in the given task, given the causes of failure and the templates that contribute to success."""
+        checkpoint = None
+        objective = None
 
         # Identify undesirable events
-        self.antiobjectives = set()
-        for template in self.theory.causes("FAILURE"):
+        antiobjectives = set()
+        for template in failures:
             if template not in self.reflexes:
                 self.reflexes[template] = QFunction(ALPHA)
-            for objective in task.frame.objectives(template):
-                self.antiobjectives.add(objective)
-                objective.s = objective.state()
+            for antiobjective in task.frame.objectives(template, self.horizon):
+                antiobjectives.add(antiobjective)
+                antiobjective.s = antiobjective.state()
 
         # Identify desirable events
         objectives = set()
-        if not task.ended():
-            for template in self.theory.contributors("SUCCESS", task.frame):
-                objectives |= task.frame.objectives(template)
+        for template in contributors:
+            objectives |= task.frame.objectives(template)
 
         # Choose the nearest objective
         if len(objectives) > 0:
@@ -152,66 +247,129 @@ class Agent(object):
             targets = {objective.subject for objective in objectives}
             searches = {source: self.map.search(source, targets) for source in sources}
             distances = {objective: searches[objective.actor].distance(objective.subject) for objective in objectives}
-            self.objective = choice([objective for objective, d in distances.items() if d == min(distances.values())])
+            objective = choice([objective for objective, d in distances.items() if d == min(distances.values())])
 
             # Prepare the objective
-            self.objective.s = self.objective.state()
-            self.objective.d = self.objective.distance()
-            if self.objective.template not in self.tactics:
-                self.tactics[self.objective.template] = QFunction(ALPHA, GAMMA)
-                self.tactics[self.objective.template].epsilon = EPSILON_MAX
-                self.tactics[self.objective.template].beta = BETA_MAX
+            objective.s = objective.state()
+            objective.d = objective.distance()
+            if objective.template not in self.tactics:
+                self.tactics[objective.template] = QFunction(ALPHA, GAMMA)
+                self.tactics[objective.template].epsilon = EPSILON_MAX
+                self.tactics[objective.template].beta = BETA_MAX
 
             # Prepare a checkpoint
-            if not self.objective.regional():
-                if not searches[self.objective.actor].found(self.objective.subject):
-                    self.objective = None
+            if not objective.regional():
+                if not searches[objective.actor].found(objective.subject):
+                    objective = None
                 else:
-                    self.checkpoint = searches[self.objective.actor].checkpoint(self.objective)
-                    self.checkpoint.s = self.checkpoint.state()
-                    self.checkpoint.d = self.checkpoint.distance()
-                    if self.checkpoint.template not in self.routes:
-                        self.routes[self.checkpoint.template] = QFunction(ALPHA, GAMMA)
-                        self.routes[self.checkpoint.template].epsilon = EPSILON_MAX
-                        self.routes[self.checkpoint.template].beta = BETA_MAX
+                    checkpoint = searches[objective.actor].checkpoint(objective)
+                    checkpoint.s = checkpoint.state()
+                    checkpoint.d = checkpoint.distance()
+                    if checkpoint.template not in self.routes:
+                        self.routes[checkpoint.template] = QFunction(ALPHA, GAMMA)
+                        self.routes[checkpoint.template].epsilon = EPSILON_MAX
+                        self.routes[checkpoint.template].beta = BETA_MAX
+
+        return objective, checkpoint, antiobjectives
 
     def update(self, task):
         """Reflect on the step just taken."""
 
-        # Update knowledge
-        if self.extend_theory:
+        # Update knowledge, unless nothing happened
+        start = timing.clock()
+        if self.extend_theory and len(task.frame.events) > 0:
             self.theory.update(task.frame)
-        if self.extend_map:
+            start = timing.lap("Theory.update", start)
+        if self.extend_map and len(task.frame.changes.transitioned) > 0:
             self.map.update(task.frame)
+            start = timing.lap("Map.update", start)
+
+        learned = self.learn(task, self.action, self.objective, self.checkpoint, self.antiobjectives)
+        start = timing.lap("Agent.learn", start)
+        if trace.sink is not None:
+            self.report(task, trace.sink.numbers[0], self.action, self.objective, self.checkpoint, self.antiobjectives, learned)
+        for policy, observation in learned:
+            policy.update(*observation)
+        timing.lap("QFunction.update", start)
+
+    def update_many(self, tasks, live):
+        """Reflect on the steps just taken in the tasks at the given positions, batching updates to each policy."""
+        observations = dict()  # By policy, in order
+        for i in live:
+            task = tasks[i]
+            start = timing.clock()
+            if self.extend_theory and len(task.frame.events) > 0:
+                self.theory.update(task.frame)
+                start = timing.lap("Theory.update", start)
+            if self.extend_map and len(task.frame.changes.transitioned) > 0:
+                self.map.update(task.frame)
+                start = timing.lap("Map.update", start)
+
+            learned = self.learn(task, self.batch_actions[i], self.batch_objectives[i], self.batch_checkpoints[i], self.batch_antiobjectives[i])
+            if trace.sink is not None:
+                self.report(task, trace.sink.numbers[i], self.batch_actions[i], self.batch_objectives[i], self.batch_checkpoints[i], self.batch_antiobjectives[i], learned)
+            for policy, observation in learned:
+                if policy not in observations:
+                    observations[policy] = [observation]
+                else:
+                    observations[policy].append(observation)
+            timing.lap("Agent.learn", start)
+
+        start = timing.clock()
+        for policy in observations:
+            policy.update_many(observations[policy])
+        timing.lap("QFunction.update", start)
+
+    def learn(self, task, action, objective, checkpoint, antiobjectives):
+        """Return a list of policies paired with observations of the step just taken, adjusting exploration and risk weights."""
+        learned = list()
 
         # Learn about routes
-        if self.checkpoint is not None:
-            policy = self.routes[self.checkpoint.template]
-            progress = self.checkpoint.d - self.checkpoint.distance()
-            if self.checkpoint.regional():
-                policy.update(self.checkpoint.s, self.action, progress + BONUS)
+        if checkpoint is not None:
+            policy = self.routes[checkpoint.template]
+            progress = checkpoint.d - checkpoint.distance()
+            if checkpoint.regional():
+                learned.append((policy, (checkpoint.s, action, progress + BONUS, None, None)))
                 policy.epsilon = max(EPSILON_MIN, policy.epsilon * EPSILON_DECAY)
                 policy.beta = BETA_MAX
-            elif task.frame.transitions(self.checkpoint.actor):
-                policy.update(self.checkpoint.s, self.action, progress - BONUS)
+            elif task.frame.transitions(checkpoint.actor):
+                learned.append((policy, (checkpoint.s, action, progress - BONUS, None, None)))
             else:
-                policy.update(self.checkpoint.s, self.action, progress, self.checkpoint.state(), task.actions())
+                learned.append((policy, (checkpoint.s, action, progress, checkpoint.state(), task.actions())))
 
         # Learn about objectives
-        elif self.objective is not None:
-            policy = self.tactics[self.objective.template]
-            progress = self.objective.d - self.objective.distance()
-            if self.objective in task.frame.events:
-                policy.update(self.objective.s, self.action, progress + BONUS)
+        elif objective is not None:
+            policy = self.tactics[objective.template]
+            progress = objective.d - objective.distance()
+            if objective in task.frame.events:
+                learned.append((policy, (objective.s, action, progress + BONUS, None, None)))
                 policy.epsilon = max(EPSILON_MIN, policy.epsilon * EPSILON_DECAY)
                 policy.beta = BETA_MAX
-            elif task.frame.supports(self.objective):
-                policy.update(self.objective.s, self.action, progress, self.objective.state(), task.actions())
+            elif task.frame.supports(objective):
+                learned.append((policy, (objective.s, action, progress, objective.state(), task.actions())))
 
         # Learn about risks
-        for objective in self.antiobjectives:
-            policy = self.reflexes[objective.template]
-            if objective in task.frame.events:
-                policy.update(objective.s, self.action, -BONUS)
-            elif task.frame.supports(objective):
-                policy.update(objective.s, self.action, 0, objective.state(), task.actions())
+        for antiobjective in antiobjectives:
+            policy = self.reflexes[antiobjective.template]
+            if antiobjective in task.frame.events:
+                learned.append((policy, (antiobjective.s, action, -BONUS, None, None)))
+            elif task.frame.supports(antiobjective):
+                learned.append((policy, (antiobjective.s, action, 0, antiobjective.state(), task.actions())))
+
+        return learned
+
+    def report(self, task, attempt, action, objective, checkpoint, antiobjectives, learned):
+        """Describe the step just taken in the given task to the trace sink, if it samples this step, before the learned observations are applied."""
+        if trace.sink.sampled(attempt, len(task.record)):
+            actions = list(task.actions())
+            policy, rewards, risks = self.evaluate(actions, objective, checkpoint, antiobjectives)
+            deltas = [policy.delta(*observation) for policy, observation in learned]
+            trace.sink.record(trace.step(attempt, task, action, objective, checkpoint, actions, rewards, risks, deltas))
+
+    @staticmethod
+    def signature(frame):
+        """Return the object types in the given frame, counting up to two of each, which is all that contributors depend on."""
+        counts = dict()
+        for obj in frame.objects:
+            counts[obj.type] = min(2, counts.get(obj.type, 0) + 1)
+        return frozenset(counts.items())
@@ -0,0 +1,234 @@
+"""Tools for saving agents in sections that load on demand."""
+
+import struct
+
+from copy import copy
+from functools import cached_property
+from pickle import dumps, loads, load as unpickle
+
+from rfd.qfunction import QFunction, encode, digest
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MAGIC = b"RFDAGENT"  # First bytes of every agent file in this format
+VERSION = 2  # Newest layout, which save writes and load reads along with older ones
+SUFFIX = ".rfd"  # Ending of agent file names that Agent.save writes in this format
+ALIGNMENT = 64  # Byte boundary at which each array starts
+
+POLICIES = ("routes", "tactics", "reflexes")  # Agent attributes holding Q-functions
+
+
+class MappedQFunction(QFunction):
+    """Q-function that reads values from arrays mapped from an agent file, loading them into an ordinary table when first updated or iterated."""
+
+    def __init__(self, filename, start, entry):
+        QFunction.__init__(self, entry["alpha"], entry["gamma"])
+        del self.q  # Built from the file when first used
+        for attribute in ("epsilon", "beta"):
+            if attribute in entry:
+                setattr(self, attribute, entry[attribute])
+        self.filename = filename
+        self.start = start  # Offset of the data sections in the file
+        self.entry = entry
+        self.columns = {action: i for i, action in enumerate(entry["actions"])}
+        self.rows = dict()  # Row found for each state, or -1
+
+    def __reduce__(self):
+        """Pickle as an ordinary QFunction, so that copies do not depend on the file."""
+        return (QFunction, (self.alpha, self.gamma), self.export().__dict__)
+
+    def array(self, name, dtype, shape):
+        """Return the named array of this table, mapped read-only from the file."""
+        if self.entry["count"] == 0:
+            return np.zeros(shape, dtype=dtype)
+        return np.memmap(self.filename, dtype=dtype, mode="r", offset=self.start + self.entry[name], shape=shape).view(np.ndarray)
+
+    @cached_property
+    def arrays(self):
+        """Map the digests, rows, values and seen flags of this table."""
+        n, a = self.entry["count"], len(self.entry["actions"])
+        return (self.array("digests", np.int64, (n,)), self.array("rows", np.int64, (n,)), self.array("values", np.float64, (n, a)), self.array("seen", np.uint8, (n, a)))
+
+    @cached_property
+    def keys(self):
+        """Map the offsets and bytes of the encoded state in each row, or load the states themselves from files that predate them."""
+        if "encoded" not in self.entry:
+            return self.states()
+        n = self.entry["count"]
+        return self.array("offsets", np.int64, (n + 1,)), self.array("encoded", np.uint8, (self.entry["size"],))
+
+    def states(self):
+        """Load the states of this table in row order."""
+        f = open(self.filename, "rb")
+        f.seek(self.start + self.entry["keys"])
+        states = loads(f.read(self.entry["length"]))
+        f.close()
+        return states
+
+    def stored(self, row, key):
+        """Return whether the given row holds the state with the given encoding, rather than one whose digest collides with it."""
+        if isinstance(self.keys, list):
+            return encode(self.keys[row]) == key
+        offsets, encoded = self.keys
+        return encoded[offsets[row]:offsets[row + 1]].tobytes() == key
+
+    @cached_property
+    def q(self):
+        """Load the whole table as an ordinary dictionary, after which it behaves like any QFunction."""
+        states = self.states()
+        digests, rows, values, seen = self.arrays
+        values, seen = np.array(values), np.array(seen)
+        actions = self.entry["actions"]
+        q = {s: {actions[i]: float(values[row, i]) for i in np.flatnonzero(seen[row])} for row, s in enumerate(states)}
+        self.__dict__.pop("arrays", None)  # Release the mappings
+        self.__dict__.pop("keys", None)
+        self.rows = dict()
+        return q
+
+    def find(self, s):
+        """Return the row for the given state, or -1 if there is none."""
+        if s not in self.rows:
+            digests, rows = self.arrays[:2]
+            code = digest(s)
+            key = encode(s)
+            self.rows[s] = -1
+            i = int(np.searchsorted(digests, code))
+            while i < len(digests) and digests[i] == code:
+                if self.stored(int(rows[i]), key):
+                    self.rows[s] = int(rows[i])
+                    break
+                i += 1
+        return self.rows[s]
+
+    def Q(self, s, a):
+        """Return a Q-value estimate for the given step."""
+        if "q" in self.__dict__:
+            return QFunction.Q(self, s, a)
+        row = self.find(s)
+        if row < 0 or a not in self.columns or not self.arrays[3][row, self.columns[a]]:
+            return 0
+        return float(self.arrays[2][row, self.columns[a]])
+
+    def values(self, s, actions):
+        """Return a list of Q-value estimates for the given state and each of the given actions."""
+        if "q" in self.__dict__:
+            return QFunction.values(self, s, actions)
+        row = self.find(s)
+        if row < 0:
+            return [0] * len(actions)
+        values, seen = self.arrays[2][row].tolist(), self.arrays[3][row].tolist()
+        return [values[self.columns[a]] if a in self.columns and seen[self.columns[a]] else 0 for a in actions]
+
+    def export(self):
+        """Return an ordinary QFunction with the same values."""
+        q = QFunction(self.alpha, self.gamma)
+        for attribute in ("epsilon", "beta"):
+            if hasattr(self, attribute):
+                setattr(q, attribute, getattr(self, attribute))
+        q.q = self.q
+        return q
+
+
+def pack(agent):
+    """Return the given agent as bytes in sections: the agent without its knowledge or policies, its theory, its map, and each Q-function as arrays."""
+    if np is None:
+        raise ImportError("Saving agents in sections requires NumPy")
+
+    shell = copy(agent)
+    shell.theory = None
+    shell.map = None
+    for policies in POLICIES:
+        setattr(shell, policies, dict())
+
+    sections = list()  # Bytes of each section, in order
+    size = [0]
+
+    def add(data):
+        """Append a section at the next aligned offset and return the offset."""
+        padding = -size[0] % ALIGNMENT
+        sections.append(bytes(padding))
+        sections.append(data)
+        size[0] += padding + len(data)
+        return size[0] - len(data)
+
+    header = {"version": VERSION, "tables": list()}
+    for name, value in (("agent", shell), ("theory", agent.theory), ("map", agent.map)):
+        data = dumps(value)
+        header[name] = (add(data), len(data))
+
+    for policies in POLICIES:
+        for template, q in getattr(agent, policies).items():
+            states = list(q.q)
+            actions = list(dict.fromkeys(a for row in q.q.values() for a in row))
+            columns = {action: i for i, action in enumerate(actions)}
+            values = np.zeros((len(states), len(actions)), dtype=np.float64)
+            seen = np.zeros((len(states), len(actions)), dtype=np.uint8)
+            for row, s in enumerate(states):
+                for a, value in q.q[s].items():
+                    values[row, columns[a]] = value
+                    seen[row, columns[a]] = 1
+
+            # Rows stay in table order, found by binary search over sorted digests
+            codes = np.array([digest(s) for s in states], dtype=np.int64)
+            rows = np.argsort(codes, kind="stable").astype(np.int64)
+            keys = dumps(states)
+            encoded = [encode(s) for s in states]
+            offsets = np.cumsum([0] + [len(key) for key in encoded], dtype=np.int64)
+
+            entry = {"policies": policies, "template": template, "count": len(states), "actions": actions, "alpha": q.alpha, "gamma": q.gamma}
+            for attribute in ("epsilon", "beta"):
+                if hasattr(q, attribute):
+                    entry[attribute] = getattr(q, attribute)
+            entry["digests"] = add(codes[rows].tobytes())
+            entry["rows"] = add(rows.tobytes())
+            entry["values"] = add(values.tobytes())
+            entry["seen"] = add(seen.tobytes())
+            entry["keys"] = add(keys)
+            entry["length"] = len(keys)
+            entry["offsets"] = add(offsets.tobytes())
+            entry["encoded"] = add(b"".join(encoded))
+            entry["size"] = int(offsets[-1])
+            header["tables"].append(entry)
+
+    # Pad after the header so that the sections keep their alignment in the file
+    header = dumps(header)
+    preamble = MAGIC + struct.pack("<IQ", VERSION, len(header)) + header
+    return preamble + bytes(-len(preamble) % ALIGNMENT) + b"".join(sections)
+
+
+def load(filename):
+    """Return the agent saved in the named file, either pickled whole or in sections, mapping its Q-functions from the file until first used."""
+    f = open(filename, "rb")
+    if f.read(len(MAGIC)) != MAGIC:
+        f.seek(0)
+        agent = unpickle(f)
+        f.close()
+        return agent
+    if np is None:
+        f.close()
+        raise ImportError("Loading agents saved in sections requires NumPy")
+
+    version, length = struct.unpack("<IQ", f.read(12))
+    if version > VERSION:
+        f.close()
+        raise ValueError("Agent file version {} is newer than version {} supported here".format(version, VERSION))
+    header = loads(f.read(length))
+    start = len(MAGIC) + 12 + length
+    start += -start % ALIGNMENT
+
+    def section(name):
+        offset, size = header[name]
+        f.seek(start + offset)
+        return loads(f.read(size))
+
+    agent = section("agent")
+    agent.theory = section("theory")
+    agent.map = section("map")
+    f.close()
+
+    for entry in header["tables"]:
+        getattr(agent, entry["policies"])[entry["template"]] = MappedQFunction(filename, start, entry)
+    return agent
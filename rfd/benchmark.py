@@ -0,0 +1,375 @@
+"""Micro-benchmarks for the hot paths of the RfD agent, run with python -m rfd.benchmark."""
+
+import json
+import platform
+import random
+import sys
+
+from argparse import ArgumentParser
+from statistics import median
+from time import perf_counter
+
+from rfd.agent import Agent
+from rfd.event import Object, Event
+from rfd.frozen import FrozenAgent
+from rfd.qfunction import QFunction
+from rfd.search import Map, HierarchicalMap, Index
+from rfd.task import TaskInterface, Frame
+from rfd.theory import Theory
+
+ROOM = 8  # Cells along each side of a region
+ROOMS = 4  # Regions along each side of a scene
+LENGTH = 200  # Steps before a scene times out
+ACTIONS = (None, "up", "down", "left", "right")
+
+# Row and column changes for each action
+DELTAS = {None: (0, 0), "up": (-1, 0), "down": (1, 0), "left": (0, -1), "right": (0, 1)}
+
+REPEAT = 5  # Timings per case, of which the median is reported
+BUDGET = 0.05  # Seconds that each timing should last
+THRESHOLD = 0.25  # Slowdown relative to a baseline that counts as a regression
+
+
+class Scene(TaskInterface):
+    """Synthetic task in which a player fetches a key that reveals a door, while wandering hazards end the attempt on contact."""
+
+    def __init__(self, hazards=8, rooms=ROOMS, length=LENGTH, seed=0):
+        self.hazard_count = hazards
+        self.rooms = rooms
+        self.limit = length
+        self.random = random.Random(seed)
+        TaskInterface.__init__(self)
+
+    def reset(self):
+        """Place the player, key and hazards for a new attempt."""
+        cells = self.random.sample(range((ROOM * self.rooms)**2), 2 + self.hazard_count)
+        locations = [divmod(cell, ROOM * self.rooms) for cell in cells]
+        self.player = Object("player", locations[0], self.region(locations[0]))
+        self.key = Object("key", locations[1], self.region(locations[1]))
+        self.door = None
+        self.hazards = {Object("hazard", location, self.region(location)) for location in locations[2:]}
+        self.dead = False
+        self.opened = False
+        self.current_events = set()
+        TaskInterface.reset(self)
+
+    def region(self, location):
+        """Return the region containing the given location."""
+        return (location[0] // ROOM, location[1] // ROOM)
+
+    def move(self, obj, action):
+        """Move the given object one step, staying within the scene."""
+        side = ROOM * self.rooms
+        delta = DELTAS[action]
+        location = (min(side - 1, max(0, obj.location[0] + delta[0])), min(side - 1, max(0, obj.location[1] + delta[1])))
+        obj.location = location
+        obj.region = self.region(location)
+
+    def actions(self):
+        """Return a set of action choices."""
+        return set(ACTIONS)
+
+    def perform(self, action):
+        """Perform the given action, then let each hazard wander."""
+        self.current_events = set()
+        self.move(self.player, action)
+        for hazard in sorted(self.hazards):
+            if self.random.random() < 0.5:
+                self.move(hazard, self.random.choice(ACTIONS))
+
+        # Contact
+        for hazard in self.hazards:
+            if hazard.location == self.player.location:
+                self.current_events.add(Event("touches", self.player, hazard))
+                self.dead = True
+        if self.key is not None and self.key.location == self.player.location:
+            self.current_events.add(Event("touches", self.player, self.key))
+            location = divmod(self.random.randrange((ROOM * self.rooms)**2), ROOM * self.rooms)
+            self.door = Object("door", location, self.region(location))
+            self.key = None
+        elif self.door is not None and self.door.location == self.player.location:
+            self.current_events.add(Event("touches", self.player, self.door))
+            self.opened = True
+
+    def objects(self):
+        """Return a set of perceived objects."""
+        return {obj for obj in (self.player, self.key, self.door) if obj is not None} | self.hazards
+
+    def events(self):
+        """Return a set of perceived events."""
+        return self.current_events
+
+    def succeeded(self):
+        """Return whether this attempt has succeeded."""
+        return self.opened
+
+    def failed(self):
+        """Return whether this attempt has failed."""
+        return self.dead
+
+    def ended(self):
+        """Return whether this attempt has ended."""
+        return self.succeeded() or self.failed() or len(self.record) >= self.limit
+
+    def score(self):
+        """Return a score for this attempt."""
+        return 1 if self.succeeded() else 0
+
+    def length(self):
+        """Return a length for this attempt."""
+        return len(self.record)
+
+
+def approach(scene, target):
+    """Return an action that moves the player of the given scene towards the target object."""
+    rows = target.location[0] - scene.player.location[0]
+    cols = target.location[1] - scene.player.location[1]
+    if rows != 0:
+        return "down" if rows > 0 else "up"
+    elif cols != 0:
+        return "right" if cols > 0 else "left"
+    else:
+        return None
+
+
+def demonstration(hazards=8, rooms=ROOMS, seed=0):
+    """Return the records of one scene solved without hazards and one ended deliberately on a hazard."""
+    solved = Scene(0, rooms, 4 * LENGTH, seed)
+    while not solved.ended():
+        solved.perform(approach(solved, solved.door if solved.key is None else solved.key))
+        solved.update()
+
+    failed = Scene(max(1, hazards), rooms, 4 * LENGTH, seed + 1)
+    failed.key = None
+    while not failed.ended():
+        failed.perform(approach(failed, min(failed.hazards, key=failed.player.distance)))
+        failed.update()
+
+    return solved.record + failed.record
+
+
+def trained(hazards, rooms=ROOMS, seed=0):
+    """Return an agent that has watched a demonstration, and a fresh scene for it to act in."""
+    random.seed(seed)
+    agent = Agent()
+    agent.observe(demonstration(hazards, rooms, seed))
+    agent.prepare()
+    return agent, Scene(hazards, rooms, LENGTH, seed + 2)
+
+
+def grid_map(rooms, world=None):
+    """Return a map, flat unless one is given, of a square grid of regions with an entrance between each pair of neighbors."""
+    world = Map() if world is None else world
+    for row in range(rooms):
+        for col in range(rooms):
+            for other in ((row + 1, col), (row, col + 1)):
+                if max(other) < rooms:
+                    location = (ROOM * other[0] + ROOM // 2 * (other[1] - col), ROOM * other[1] + ROOM // 2 * (other[0] - row))
+                    world.connect((row, col), other, location)
+                    world.connect(other, (row, col), location)
+    return world
+
+
+def frame_case(size):
+    """Build a frame with the given number of hazards from a scene in progress."""
+    scene = Scene(size)
+    objects, events = scene.objects(), scene.events()
+    return lambda: Frame(scene.frame, objects, events, False, False)
+
+
+def theory_update_case(size):
+    """Update a theory with a recorded frame from a scene with the given number of hazards."""
+    theory = Theory()
+    for frame in demonstration(size):
+        theory.update(frame)
+    frame = demonstration(size)[-1]
+    return lambda: theory.update(frame)
+
+
+def observe_case(size):
+    """Build the knowledge of a fresh agent from a demonstration with the given number of hazards."""
+    record = demonstration(size)
+    return lambda: Agent().observe(record)
+
+
+def theory_contributors_case(size):
+    """Find templates contributing to success in a scene with the given number of hazards."""
+    agent, scene = trained(size)
+    return lambda: agent.theory.contributors("SUCCESS", scene.frame)
+
+
+def map_search_case(size, world=None):
+    """Search a grid map with the given number of regions along each side for several targets."""
+    world = grid_map(size, world)
+    generator = random.Random(size)
+    side = ROOM * size
+    source = Object("player", (0, 0), (0, 0))
+    targets = set()
+    for i in range(8):
+        location = (generator.randrange(side), generator.randrange(side))
+        targets.add(Object("target", location, (location[0] // ROOM, location[1] // ROOM)))
+    return lambda: world.search(source, targets)
+
+
+def hierarchical_search_case(size):
+    """Search a hierarchical grid map with the given number of regions along each side for several targets."""
+    return map_search_case(size, HierarchicalMap())
+
+
+def qfunction_update_case(size):
+    """Update a Q-function over the given number of states, bootstrapping from a successor state."""
+    q = QFunction(0.1, 0.9)
+    generator = random.Random(size)
+    steps = [((generator.randrange(size), "up"), generator.choice(ACTIONS), generator.random(), (generator.randrange(size), "up")) for i in range(1024)]
+    for s, a, r, sp in steps:
+        q.update(s, a, r, sp, ACTIONS)
+    position = [0]
+
+    def update():
+        s, a, r, sp = steps[position[0] % len(steps)]
+        position[0] += 1
+        q.update(s, a, r, sp, ACTIONS)
+
+    return update
+
+
+def act_case(size):
+    """Choose an action in a scene with the given number of hazards."""
+    agent, scene = trained(size)
+    return lambda: agent.act(scene)
+
+
+def frozen_act_case(size):
+    """Choose an action in a scene with the given number of hazards, using a compiled copy of the agent after a few attempts."""
+    agent, scene = trained(size)
+    for seed in range(4):
+        agent.attempt(Scene(size, ROOMS, LENGTH, seed + 3))
+    frozen = FrozenAgent(agent, ACTIONS)
+    return lambda: frozen.act(scene)
+
+
+def act_horizon_case(size):
+    """Choose an action in a scene with the given number of hazards, ignoring hazards more than a room away."""
+    agent, scene = trained(size)
+    agent.horizon = ROOM
+    return lambda: agent.act(scene)
+
+
+def index_case(size):
+    """Index a scene with the given number of hazards and find the hazards within a room of the player."""
+    scene = Scene(size)
+    frame = scene.frame
+    return lambda: Index(frame.locations).within(scene.player.location, ROOM, "hazard")
+
+
+def strategize_case(size):
+    """Choose an objective in a scene with the given number of hazards."""
+    agent, scene = trained(size)
+    return lambda: agent.strategize(scene)
+
+
+def update_case(size):
+    """Reflect on a step taken in a scene with the given number of hazards."""
+    agent, scene = trained(size)
+    scene.perform(agent.act(scene))
+    scene.update()
+    return lambda: agent.update(scene)
+
+
+# Name, fixture builder and sizes of each case
+CASES = [
+    ("Frame", frame_case, (4, 16, 64)),
+    ("Theory.update", theory_update_case, (4, 16, 64)),
+    ("Theory.contributors", theory_contributors_case, (4, 16, 64)),
+    ("Agent.observe", observe_case, (4, 16, 64)),
+    ("Map.search", map_search_case, (2, 4, 8)),
+    ("HierarchicalMap.search", hierarchical_search_case, (8, 16, 32)),
+    ("QFunction.update", qfunction_update_case, (16, 256, 4096)),
+    ("Index.within", index_case, (4, 16, 64)),
+    ("Agent.act", act_case, (4, 16, 64)),
+    ("Agent.act.horizon", act_horizon_case, (4, 16, 64)),
+    ("FrozenAgent.act", frozen_act_case, (4, 16, 64)),
+    ("Agent.strategize", strategize_case, (4, 16, 64)),
+    ("Agent.update", update_case, (4, 16, 64)),
+]
+
+
+def measure(function, repeat=REPEAT, budget=BUDGET):
+    """Return timings of the given function in microseconds per call, calling it often enough for each timing to last the budget."""
+    number = 1
+    while True:
+        start = perf_counter()
+        for i in range(number):
+            function()
+        elapsed = perf_counter() - start
+        if elapsed >= budget:
+            break
+        number *= 2 if elapsed <= 0 else max(2, min(10, int(1.2 * budget / elapsed) + 1))
+
+    times = list()
+    for r in range(repeat):
+        start = perf_counter()
+        for i in range(number):
+            function()
+        times.append(1e6 * (perf_counter() - start) / number)
+    return {"median": median(times), "min": min(times), "number": number, "repeat": repeat}
+
+
+def run(pattern="", repeat=REPEAT, budget=BUDGET, verbose=True):
+    """Time every case whose name contains the given pattern and return a report."""
+    results = dict()
+    for name, builder, sizes in CASES:
+        if pattern in name:
+            for size in sizes:
+                key = "{}[{}]".format(name, size)
+                results[key] = measure(builder(size), repeat, budget)
+                if verbose:
+                    print("{:<30}{:>12.2f} us".format(key, results[key]["median"]), file=sys.stderr)
+    return {"python": platform.python_version(), "machine": platform.machine(), "results": results}
+
+
+def compare(report, baseline, threshold=THRESHOLD):
+    """Print how the given report compares to the baseline and return the names of cases that regressed."""
+    regressions = list()
+    print("{:<30}{:>12}{:>12}{:>8}".format("Case", "Baseline", "Current", "Ratio"))
+    for key, result in report["results"].items():
+        if key in baseline["results"]:
+            before = baseline["results"][key]["median"]
+            ratio = result["median"] / before if before > 0 else 1.0
+            flag = ""
+            if ratio > 1 + threshold:
+                regressions.append(key)
+                flag = "  REGRESSION"
+            print("{:<30}{:>12.2f}{:>12.2f}{:>8.2f}{}".format(key, before, result["median"], ratio, flag))
+    return regressions
+
+
+def main(arguments=None):
+    """Run the benchmarks from the command line."""
+    parser = ArgumentParser(description="Time the hot paths of the RfD agent.")
+    parser.add_argument("--output", help="file for the JSON report, instead of standard output")
+    parser.add_argument("--compare", metavar="BASELINE", help="JSON report to compare against, exiting with status 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="slowdown that counts as a regression (default %(default)s)")
+    parser.add_argument("--filter", default="", help="only run cases whose names contain this text")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="timings per case (default %(default)s)")
+    parser.add_argument("--budget", type=float, default=BUDGET, help="seconds per timing (default %(default)s)")
+    arguments = parser.parse_args(arguments)
+
+    report = run(arguments.filter, arguments.repeat, arguments.budget)
+    if arguments.output is None:
+        print(json.dumps(report, indent=2))
+    else:
+        f = open(arguments.output, "w")
+        json.dump(report, f, indent=2)
+        f.close()
+
+    if arguments.compare is not None:
+        f = open(arguments.compare)
+        baseline = json.load(f)
+        f.close()
+        if len(compare(report, baseline, arguments.threshold)) > 0:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Tools for evaluating a trained agent that no longer learns."""
+
+from copy import deepcopy
+from math import inf
+from random import choice, random
+
+from rfd.agent import Agent, BETA_MAX, LIMIT
+from rfd.search import Map, Search
+
+
+class FrozenAgent(object):
+    """Compiled copy of a trained agent that chooses actions from precomputed values, without updating anything."""
+
+    def __init__(self, agent, actions, epsilon=0.0, beta=BETA_MAX):
+        self.actions = list(actions)  # Every action the task offers, in a fixed order
+        self.epsilon = epsilon  # Fixed exploration rate
+        self.beta = beta  # Fixed risk weight
+        self.horizon = agent.horizon
+
+        # Knowledge as it stood when compiled, with shortest distances between all entrances since the map no longer changes,
+        # searched flat since a hierarchical search skips the entrances inside clusters without targets
+        self.theory = deepcopy(agent.theory)
+        self.exits = dict()  # Entrances leading out of each region
+        self.arrivals = dict()  # Entrances leading into each region
+        for region, neighbors in agent.map.entrances.items():
+            for entrance in (entrance for entrances in neighbors.values() for entrance in entrances.values()):
+                self.exits.setdefault(region, []).append(entrance)
+                self.arrivals.setdefault(entrance.region, []).append(entrance)
+        self.between = {entrance: Map.search(agent.map, entrance, ()).distances for entrances in self.exits.values() for entrance in entrances}
+        self.failures = [template for template in self.theory.causes("FAILURE") if template in agent.reflexes]  # Only those with learned risks matter
+
+        # Values of every action in each known state, and the greedy actions among them
+        self.routes = {template: self.compile(q) for template, q in agent.routes.items()}
+        self.tactics = {template: self.compile(q) for template, q in agent.tactics.items()}
+        self.reflexes = {template: self.compile(q)[0] for template, q in agent.reflexes.items()}
+        self.zeros = tuple(0 for a in self.actions)
+
+    def compile(self, q):
+        """Return dictionaries of the value tuple and the tuple of greedy actions in each state of the given Q-function."""
+        values = dict()
+        greedy = dict()
+        for s in q.q:
+            row = tuple(q.values(s, self.actions))
+            best = max(row)
+            values[s] = row
+            greedy[s] = tuple(a for a, value in zip(self.actions, row) if value >= best)
+        return values, greedy
+
+    def attempt(self, task):
+        """Try to complete the given task."""
+        while not task.ended():
+            task.perform(self.act(task))
+            task.update()
+            if len(task.record) > LIMIT:
+                break
+
+    def attempt_many(self, tasks):
+        """Try to complete the given tasks in lockstep."""
+        live = [task for task in tasks if not task.ended()]
+        while len(live) > 0:
+            type(live[0]).perform_all(live, self.act_many(live))
+            for task in live:
+                task.update()
+            live = [task for task in live if not task.ended() and len(task.record) <= LIMIT]
+
+    def act(self, task):
+        """Choose an action in the given task."""
+        contributors = set() if task.ended() else self.theory.contributors("SUCCESS", task.frame)
+        return self.choose(task.frame, contributors)
+
+    def act_many(self, tasks):
+        """Return a list of actions chosen in the given tasks, sharing work among them."""
+        contributors = dict()  # By object type signature
+        actions = list()
+        for task in tasks:
+            if task.ended():
+                actions.append(self.choose(task.frame, set()))
+            else:
+                signature = Agent.signature(task.frame)
+                if signature not in contributors:
+                    contributors[signature] = self.theory.contributors("SUCCESS", task.frame)
+                actions.append(self.choose(task.frame, contributors[signature]))
+        return actions
+
+    def choose(self, frame, contributors):
+        """Choose an action in the given frame, pursuing the nearest objective among the given templates as the agent would."""
+
+        # Risk of each action, from undesirable events in reach
+        risks = None
+        for template in self.failures:
+            values = self.reflexes[template]
+            for antiobjective in frame.objectives(template, self.horizon):
+                row = values.get(antiobjective.state())
+                if row is not None:
+                    risks = [-value for value in row] if risks is None else [risk - value for risk, value in zip(risks, row)]
+
+        # Value of each action, from the route or tactic for the nearest objective
+        table, s = self.target(frame, contributors)
+        if table is None or random() < self.epsilon:
+            if risks is None:
+                return choice(self.actions)
+            safest = min(risks)
+            return choice([a for a, risk in zip(self.actions, risks) if risk <= safest])
+        elif risks is None:
+            greedy = table[1].get(s)
+            return choice(self.actions if greedy is None else greedy)
+        else:
+            row = table[0].get(s, self.zeros)
+            values = [value - self.beta * risk for value, risk in zip(row, risks)]
+            best = max(values)
+            return choice([a for a, value in zip(self.actions, values) if value >= best])
+
+    def target(self, frame, contributors):
+        """Return the compiled route or tactic for the nearest objective among the given templates, and the state it is in, or None."""
+        objectives = set()
+        for template in contributors:
+            objectives |= frame.objectives(template)
+        if len(objectives) == 0:
+            return None, None
+
+        # Nearest objective, reached through a checkpoint if it is in another region
+        sources = {objective.actor for objective in objectives}
+        targets = {objective.subject for objective in objectives}
+        searches = {source: self.search(source, targets) for source in sources}
+        distances = {objective: searches[objective.actor].distance(objective.subject) for objective in objectives}
+        nearest = min(distances.values())
+        objective = choice([objective for objective, d in distances.items() if d == nearest])
+        if objective.regional():
+            return self.tactics.get(objective.template), objective.state()
+        elif not searches[objective.actor].found(objective.subject):
+            return None, None
+        checkpoint = searches[objective.actor].checkpoint(objective)
+        return self.routes.get(checkpoint.template), checkpoint.state()
+
+    def search(self, source, targets):
+        """Return a search from the source to the targets that leaves through the entrance starting the shortest path to each."""
+        predecessors = {source: None}
+        distances = {source: 0}
+        exits = self.exits.get(source.region, ())
+        for target in targets:
+            if target is None:
+                continue
+            best, first = (source.distance(target), source) if target.region == source.region else (inf, None)
+            for departure in exits:
+                between = self.between[departure]
+                for arrival in self.arrivals.get(target.region, ()):
+                    if arrival in between:
+                        cost = source.distance(departure) + between[arrival] + arrival.distance(target)
+                        if cost < best:
+                            best, first = cost, departure
+            if first is not None:
+                predecessors[target] = first
+                distances[target] = best
+                if first is not source:
+                    predecessors[first] = source
+        return Search(predecessors, distances)
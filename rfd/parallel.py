@@ -0,0 +1,226 @@
+"""Tools for training one agent with several worker processes."""
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from glob import glob
+from multiprocessing import get_context
+from pickle import load, loads, dumps
+from random import randrange, seed as reseed
+
+from rfd import trace
+from rfd.agent import ALPHA, GAMMA, BETA_MAX, EPSILON_MAX, EPSILON_MIN
+from rfd.qfunction import QFunction
+from rfd.theory import Evidence
+from rfd.search import Passages, movements
+from rfd.shared import SharedQFunction, POLICIES, share, unshare, exported
+
+generator = None  # Task generator in a worker process
+
+
+class Experience(object):
+    """Compact record of what a worker learned during one attempt."""
+
+    def __init__(self, score, length):
+        self.score = score
+        self.length = length
+        self.updates = list()  # Q-function updates as (policies, template, s, a, r, sp, actions)
+        self.decays = dict()  # Exploration rate ratio for each (policies, template)
+        self.causes = list()  # Theory updates as (causes, effects)
+        self.transitions = list()  # Map updates as (previous, current, location)
+
+
+class LoggedQFunction(QFunction):
+    """Q-function in a worker process that takes over the state of another and records each update under its name."""
+
+    def __init__(self, q, name, log):
+        self.__dict__.update(q.__dict__)
+        self.name = name  # Collection and template
+        self.log = log
+
+    def update(self, s, a, r, sp=None, actions=None):
+        """Record and make an update based on the given observation."""
+        self.log.append(self.name + (s, a, r, sp, actions))
+        QFunction.update(self, s, a, r, sp, actions)
+
+
+class LoggedCollection(dict):
+    """Collection of an agent's Q-functions in a worker process that records updates to every ordinary Q-function put in it."""
+
+    def __init__(self, policies, collection, log):
+        dict.__init__(self)
+        self.policies = policies
+        self.log = log
+        for template, q in collection.items():
+            self[template] = q
+
+    def __setitem__(self, template, q):
+        """Keep the given Q-function, recording its updates unless it is shared and already updated in place."""
+        if type(q) is QFunction:
+            q = LoggedQFunction(q, (self.policies, template), self.log)
+        dict.__setitem__(self, template, q)
+
+
+def train(agent, task_generator, demo_file, agent_file, attempts, window, frequency, processes=2, broadcast=None, seed=None, shared=None, summarize_processes=0):
+    """Train and save one agent, after watching the demonstrations in a file, glob pattern or list of either, while worker processes attempt tasks with copies of it, optionally sharing Q-functions for the given list of actions."""
+
+    agent.adopt(*summarize(demo_file, summarize_processes))
+    agent.save(agent_file)
+
+    broadcast = frequency if broadcast is None else broadcast
+    context = get_context("fork")
+    executor = ProcessPoolExecutor(processes, mp_context=context, initializer=initialize, initargs=(task_generator,))
+
+    # Keep every worker busy, collecting results in submission order
+    replaced = list()  # Shared tables that queued attempts may still use
+    if shared is not None:
+        replaced += share(agent, shared)
+    payload = dumps(agent)
+    futures = deque()
+    submitted = 0
+    while submitted < min(attempts, 2 * processes):
+        submitted += 1
+        futures.append(executor.submit(work, payload, randrange(2**32) if seed is None else seed + submitted))
+
+    lengths = list()
+    scores = list()
+
+    for attempt in range(1, attempts + 1):
+        experience = futures.popleft().result()
+        apply(agent, experience)
+
+        lengths.append(experience.length)
+        scores.append(experience.score)
+
+        if attempt % broadcast == 0:
+            if shared is not None:
+                replaced += share(agent, shared)
+            payload = dumps(agent)
+        if submitted < attempts:
+            submitted += 1
+            futures.append(executor.submit(work, payload, randrange(2**32) if seed is None else seed + submitted))
+
+        if attempt % frequency == 0:
+            length = sum(lengths)
+            score = sum(scores[-window:]) / len(scores[-window:])
+
+            exported(agent).save(agent_file)
+            print("{:<10}{:<10}{:<10}".format(attempt, round(score, 2), length))
+
+    executor.shutdown()
+    unshare(agent)
+    for q in replaced:
+        q.release()
+
+
+def demonstrations(demo_files):
+    """Return a list of demo file names from a file name, a glob pattern or a list of either, expanding each pattern in sorted order."""
+    if isinstance(demo_files, str):
+        demo_files = [demo_files]
+    names = list()
+    for pattern in demo_files:
+        matches = sorted(glob(pattern))
+        names += matches if len(matches) > 0 else [pattern]  # Let a missing file fail when it is opened
+    return names
+
+
+def summarize(demo_files, processes=0):
+    """Return evidence and passages summarizing the demonstrations in a file, glob pattern or list of either, in order, using worker processes if asked."""
+    names = demonstrations(demo_files)
+    if processes > 0 and len(names) > 1:
+        executor = ProcessPoolExecutor(min(processes, len(names)), mp_context=get_context("fork"))
+        summaries = list(executor.map(digest, names))
+        executor.shutdown()
+    else:
+        summaries = [digest(name) for name in names]
+
+    # Merge in the order of the files, however the workers finished
+    evidence, passages = Evidence(), Passages()
+    for demo_evidence, demo_passages in summaries:
+        evidence = evidence.merge(demo_evidence)
+        passages = passages.merge(demo_passages)
+    return evidence, passages
+
+
+def digest(demo_file):
+    """Load a demonstration and return evidence and passages summarizing it."""
+    f = open(demo_file, "rb")
+    record = load(f)
+    f.close()
+
+    evidence, passages = Evidence(), Passages()
+    evidence.observe(record)
+    passages.observe(record)
+    return evidence, passages
+
+
+def apply(agent, experience):
+    """Bring the knowledge and policies of the given agent up to date with a worker's experience."""
+    if agent.extend_theory:
+        agent.theory.learn(experience.causes)
+    if agent.extend_map:
+        agent.map.learn(experience.transitions)
+
+    for policies, template, s, a, r, sp, actions in experience.updates:
+        policy(agent, policies, template).update(s, a, r, sp, actions)
+    for (policies, template), ratio in experience.decays.items():
+        q = policy(agent, policies, template)
+        q.epsilon = max(EPSILON_MIN, q.epsilon * ratio)
+
+
+def policy(agent, policies, template):
+    """Return the agent's Q-function for the given template in the named collection, creating it as the agent would."""
+    collection = getattr(agent, policies)
+    if template not in collection:
+        if policies == "reflexes":
+            collection[template] = QFunction(ALPHA)
+        else:
+            collection[template] = QFunction(ALPHA, GAMMA)
+            collection[template].epsilon = EPSILON_MAX
+            collection[template].beta = BETA_MAX
+    return collection[template]
+
+
+def initialize(task_generator):
+    """Keep the task generator in a worker process."""
+    global generator
+    generator = task_generator
+    trace.sink = None  # Its writer thread does not survive the fork
+
+
+def work(payload, seed):
+    """Attempt a task with a fresh copy of the broadcast agent and return what was learned."""
+    reseed(seed)
+    agent = loads(payload)
+    task = generator()
+
+    # Exploration rates before the attempt
+    epsilons = dict()
+    for policies in ("routes", "tactics"):
+        for template, q in getattr(agent, policies).items():
+            epsilons[policies, template] = q.epsilon
+
+    log = list()
+    for policies in POLICIES:
+        setattr(agent, policies, LoggedCollection(policies, getattr(agent, policies), log))
+    agent.attempt(task)
+
+    experience = Experience(task.score(), task.length())
+    experience.updates = log
+    for policies in POLICIES:
+        for q in getattr(agent, policies).values():
+            if isinstance(q, SharedQFunction):
+                q.detach()
+
+    for policies in ("routes", "tactics"):
+        for template, q in getattr(agent, policies).items():
+            before = epsilons.get((policies, template), EPSILON_MAX)
+            if q.epsilon != before:
+                experience.decays[policies, template] = q.epsilon / before
+
+    # Only frames with events change the theory, and only region changes extend the map
+    for frame in task.record:
+        if len(frame.events) > 0:
+            experience.causes.append(({event.template for event in frame.events}, frame.observations()))
+        experience.transitions += movements(frame)
+
+    return experience
@@ -0,0 +1,72 @@
+"""Tools for building tasks in the background."""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from multiprocessing import get_context
+from random import randrange, seed as reseed
+
+generator = None  # Task generator in a worker process
+generator_seeded = False  # Whether it takes a seed
+
+
+class Prefetcher(object):
+    """Task generator that keeps upcoming tasks under construction while the current one is attempted."""
+
+    def __init__(self, task_generator, size, processes=0, seed=None, seeded=False):
+        self.task_generator = task_generator
+        self.seed = seed
+        self.seeded = seeded  # Whether the task generator takes a seed and draws from its own random.Random
+        self.count = 0
+
+        # Seeds are drawn on the main thread in submission order, only when a worker process or a seeded generator uses
+        # them, so that an unseeded thread draws nothing extra from the random state it shares with the main thread
+
+        # A thread works for any task, while processes build tasks in parallel if the tasks can be pickled
+        if processes > 0:
+            context = get_context("fork")
+            self.executor = ProcessPoolExecutor(processes, mp_context=context, initializer=initialize, initargs=(task_generator, seeded))
+        else:
+            self.executor = ThreadPoolExecutor(1)
+
+        # Keep a fixed number of tasks in progress
+        self.futures = deque()
+        for i in range(size):
+            self.submit()
+
+    def __call__(self):
+        """Return the next task, in submission order."""
+        task = self.futures.popleft().result()
+        self.submit()
+        return task
+
+    def submit(self):
+        """Start building another task."""
+        if not isinstance(self.executor, ThreadPoolExecutor):
+            self.futures.append(self.executor.submit(build, self.next_seed()))
+        elif self.seeded:
+            self.futures.append(self.executor.submit(self.task_generator, self.next_seed()))
+        else:
+            self.futures.append(self.executor.submit(self.task_generator))
+
+    def next_seed(self):
+        """Return a seed for the next task, drawn on the main thread in submission order."""
+        self.count += 1
+        return randrange(2**32) if self.seed is None else self.seed + self.count
+
+    def close(self):
+        """Stop building tasks."""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.futures.clear()
+
+
+def initialize(task_generator, seeded=False):
+    """Keep the task generator in a worker process, noting whether it takes a seed."""
+    global generator, generator_seeded
+    generator = task_generator
+    generator_seeded = seeded
+
+
+def build(seed):
+    """Build a task in a worker process, seeded so that workers do not repeat each other."""
+    reseed(seed)
+    return generator(seed) if generator_seeded else generator()
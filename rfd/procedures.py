@@ -1,27 +1,61 @@
 """Common procedures for training and inspecting agents."""
 
-from pickle import load
-
-
-def train(agent, task_generator, demo_file, agent_file, attempts, window, frequency):
-    """Train and save one agent."""
-
-    f = open(demo_file, "rb")
-    demo = load(f)
-    f.close()
-
-    agent.observe(demo)
+from rfd import archive, timing
+from rfd.parallel import summarize
+from rfd.task import TaskPool
+from rfd.prefetch import Prefetcher
+
+
+class Options(object):
+    """Choices of how to run training and plotting, apart from what the agent attempts and learns."""
+
+    def __init__(self, prefetch=0, processes=0, seed=None, summarize_processes=0, reuse=False, batch=1, timed=False):
+        self.prefetch = prefetch  # Tasks to keep under construction in the background
+        self.processes = processes  # Worker processes building those tasks, or none for a thread
+        self.seed = seed  # First task seed for worker processes, or None for random seeds
+        self.summarize_processes = summarize_processes  # Worker processes summarizing demonstrations
+        self.reuse = reuse  # Whether to reset finished tasks instead of generating new ones, which repeats their environments
+        self.batch = batch  # Tasks attempted in lockstep
+        self.timed = timed  # Whether to report the time spent in each phase
+
+    def tasks(self, task_generator):
+        """Return a task generator that reuses or prefetches tasks from the given one as chosen."""
+        if self.reuse:
+            return TaskPool(task_generator)
+        elif self.prefetch > 0:
+            return Prefetcher(task_generator, self.prefetch, self.processes, self.seed)
+        else:
+            return task_generator
+
+    def release(self, task_generator, task):
+        """Return a finished task to the given task generator if it reuses tasks."""
+        if self.reuse:
+            task_generator.release(task)
+
+    def close(self, task_generator):
+        """Stop the given task generator if it prefetches tasks."""
+        if self.prefetch > 0 and not self.reuse:
+            task_generator.close()
+
+
+def train(agent, task_generator, demo_file, agent_file, attempts, window, frequency, options=None):
+    """Train and save one agent after watching the demonstrations in a file, glob pattern or list of either."""
+    options = Options() if options is None else options
+
+    agent.adopt(*summarize(demo_file, options.summarize_processes))
     agent.save(agent_file)
 
+    task_generator = options.tasks(task_generator)
     lengths = list()
     scores = list()
+    if options.timed:
+        timing.enable()
 
-    for attempt in range(1, attempts + 1):
-        task = task_generator()
-        agent.attempt(task)
+    for attempt, task in run(agent, task_generator, attempts, options.batch):
 
         lengths.append(task.length())
         scores.append(task.score())
+        options.release(task_generator, task)
 
         if attempt % frequency == 0:
             length = sum(lengths)
@@ -29,14 +63,19 @@ def train(agent, task_generator, demo_file, agent_file, attempts, window, freque
 
             agent.save(agent_file)
             print("{:<10}{:<10}{:<10}".format(attempt, round(score, 2), length))
+            if options.timed:
+                print(timing.summary(frequency))
+                timing.reset()
+
+    if options.timed:
+        timing.disable()
+    options.close(task_generator)
 
 
 def display(task_generator, agent_file):
     """Show a saved agent making attempts."""
 
-    f = open(agent_file, "rb")
-    agent = load(f)
-    f.close()
+    agent = archive.load(agent_file)  # Q-functions of agents saved in sections stay on disk until used
     print()
 
     input("Enter to view theory:")
@@ -57,31 +96,33 @@ def display(task_generator, agent_file):
         print()
 
 
-def plot(agent_generator, task_generator, demo_file, plot_file, curves, attempts, window, frequency):
-    """Plot multiple learning curves."""
+def plot(agent_generator, task_generator, demo_file, plot_file, curves, attempts, window, frequency, options=None):
+    """Plot multiple learning curves of agents watching the demonstrations in a file, glob pattern or list of either."""
+    options = Options() if options is None else options
 
-    f = open(demo_file, "rb")
-    record = load(f)
-    f.close()
+    # Summarized once, since every curve starts from the same demonstrations
+    evidence, passages = summarize(demo_file, options.summarize_processes)
 
     f = open(plot_file, "w")
     f.close()
 
+    task_generator = options.tasks(task_generator)
     for curve in range(1, curves + 1):
         print("Curve", curve, "...")
 
         agent = agent_generator()
-        agent.observe(record)
+        agent.adopt(evidence, passages)
 
         lengths = list()
         scores = list()
+        if options.timed:
+            timing.enable()
 
-        for attempt in range(1, attempts + 1):
-            task = task_generator()
-            agent.attempt(task)
+        for attempt, task in run(agent, task_generator, attempts, options.batch):
 
             lengths.append(task.length())
             scores.append(task.score())
+            options.release(task_generator, task)
 
             if attempt % frequency == 0:
                 length = sum(lengths)
@@ -90,3 +131,26 @@ def plot(agent_generator, task_generator, demo_file, plot_file, curves, attempts
                 f = open(plot_file, "a")
                 f.write(str(sum(lengths)) + "\t"*curve + str(score) + "\n")
                 f.close()
+                if options.timed:
+                    print("{:<10}{:<10}{:<10}".format(attempt, round(score, 2), length))
+                    print(timing.summary(frequency))
+                    timing.reset()
+
+    if options.timed:
+        timing.disable()
+    options.close(task_generator)
+
+
+def run(agent, task_generator, attempts, batch=1):
+    """Generate numbered tasks as the agent finishes attempting them, attempting up to a batch of tasks at a time in lockstep."""
+    attempt = 0
+    while attempt < attempts:
+        tasks = [task_generator() for i in range(min(batch, attempts - attempt))]
+        if len(tasks) == 1:
+            agent.attempt(tasks[0])
+        else:
+            agent.attempt_many(tasks)
+
+        for task in tasks:
+            attempt += 1
+            yield attempt, task
@@ -1,5 +1,9 @@
 """Tools for reinforcement learning."""
 
+from hashlib import blake2b
+from numbers import Integral, Real
+from pickle import dumps
+
 
 class QFunction(object):
     """Map-based Q-function."""
@@ -13,11 +17,18 @@ class QFunction(object):
         """Return a Q-value estimate for the given step."""
         return self.q[s][a] if s in self.q and a in self.q[s] else 0
 
+    def values(self, s, actions):
+        """Return a list of Q-value estimates for the given state and each of the given actions."""
+        if s not in self.q:
+            return [0] * len(actions)
+        row = self.q[s]
+        return [row[a] if a in row else 0 for a in actions]
+
     def delta(self, s, a, r, sp=None, actions=None):
         """Return a Q-value change produced by the given observation."""
         delta = r - self.Q(s, a)
         if sp is not None and actions is not None and len(actions) > 0:
-            delta += self.gamma * max(self.Q(sp, ap) for ap in actions)
+            delta += self.gamma * max(self.values(sp, actions))
         return delta
 
     def update(self, s, a, r, sp=None, actions=None):
@@ -28,3 +39,32 @@ class QFunction(object):
         if a not in self.q[s]:
             self.q[s][a] = 0
         self.q[s][a] += self.alpha * delta
+
+    def update_many(self, observations):
+        """Update Q-values based on the given observations, in order."""
+        for s, a, r, sp, actions in observations:
+            self.update(s, a, r, sp, actions)
+
+
+def normalize(state):
+    """Return the given state with numbers of any kind replaced by plain ints and floats, as dictionary keys would compare them."""
+    if isinstance(state, tuple):
+        return tuple(normalize(value) for value in state)
+    elif isinstance(state, Integral):
+        return int(state)
+    elif isinstance(state, Real):
+        value = float(state)
+        return int(value) if value.is_integer() else value
+    else:
+        return state
+
+
+def encode(state):
+    """Return a byte string that encodes the given state identically in every process."""
+    return dumps(normalize(state), protocol=4)
+
+
+def digest(state):
+    """Return a nonzero 64-bit integer that identifies the given state identically in every process."""
+    value = int.from_bytes(blake2b(encode(state), digest_size=8).digest(), "little", signed=True)
+    return 1 if value == 0 else value
@@ -1,10 +1,14 @@
 """Tools for spatial reasoning."""
 
+from itertools import product
 from math import inf
 from heapq import heappush, heappop
 
 from rfd.event import Object, Event
 
+CELL = 8  # Side of each bucket in a spatial index
+CLUSTER = 16  # Most regions in each cluster of a hierarchical map
+
 
 class Map(object):
     """Graph of region connectivity."""
@@ -21,29 +25,34 @@ class Map(object):
 
     def update(self, frame):
         """Add region connectivity based on observed movements."""
-        for obj in frame.objects:
-            if frame.transitions(obj):
-                current = frame.regions[obj]
-                previous = frame.previous.regions[obj]
-                if current is not None and previous is not None:
-                    location = frame.locations[obj]
-                    entrance = Object(str(location), location, current)
-                    if previous not in self.entrances:
-                        self.entrances[previous] = dict()
-                    if current not in self.entrances[previous]:
-                        self.entrances[previous][current] = {location: entrance}
+        self.learn(movements(frame))
+
+    def observe(self, record):
+        """Add region connectivity based on every frame of the given record, as updating with each frame in turn would."""
+        passages = Passages()
+        passages.observe(record)
+        self.adopt(passages)
+
+    def adopt(self, passages):
+        """Add region connectivity from summarized transitions, as connecting each transition they summarize would."""
+        self.learn(passages.transitions())
+
+    def learn(self, transitions):
+        """Add region connectivity from a sequence of (previous, current, location) transitions, keeping the first entrance between each pair of regions."""
+        for previous, current, location in transitions:
+            self.connect(previous, current, location)
+
+    def connect(self, previous, current, location):
+        """Add an entrance at the given location from the previous region to the current one, unless they are already connected."""
+        if previous not in self.entrances:
+            self.entrances[previous] = dict()
+        if current not in self.entrances[previous]:
+            self.entrances[previous][current] = {location: Object(str(location), location, current)}
 
     def search(self, source, targets):
         """Find shortest paths from the source to the targets."""
 
-        # Group targets by region
-        regions = dict()
-        for obj in targets:
-            if obj is not None:
-                if obj.region not in regions:
-                    regions[obj.region] = {obj}
-                else:
-                    regions[obj.region].add(obj)
+        regions = group(targets)
 
         # Initialize search data
         predecessors = {source: None}
@@ -80,6 +89,136 @@ class Map(object):
         return Search(predecessors, distances)
 
 
+class HierarchicalMap(Map):
+    """Graph of region connectivity that groups regions into clusters and crosses clusters away from the source and targets in one step."""
+
+    def __init__(self, size=CLUSTER):
+        Map.__init__(self)
+        self.size = size
+        self.clusters = dict()  # Cluster of each region
+        self.members = dict()  # Regions in each cluster
+        self.crossings = dict()  # Distances from entrances into each cluster to the exits from it, as they are needed
+
+    def assign(self, region, neighbor=None):
+        """Put a newly seen region in the cluster of the given neighbor if it has room, or in a new cluster."""
+        if region not in self.clusters:
+            if neighbor in self.clusters and len(self.members[self.clusters[neighbor]]) < self.size:
+                cluster = self.clusters[neighbor]
+            else:
+                cluster = len(self.members)
+                self.members[cluster] = set()
+            self.clusters[region] = cluster
+            self.members[cluster].add(region)
+
+    def connect(self, previous, current, location):
+        """Add an entrance at the given location from the previous region to the current one, unless they are already connected."""
+        if previous in self.entrances and current in self.entrances[previous]:
+            return
+        self.assign(previous)
+        self.assign(current, previous)
+        Map.connect(self, previous, current, location)
+
+        # Paths across the cluster being left may now be shorter, while an entrance into another cluster only needs its own crossing
+        self.crossings.pop(self.clusters[previous], None)
+
+    def crossing(self, entrance):
+        """Return a dictionary of the distances from the given entrance to each exit from its cluster, along paths within the cluster."""
+        cluster = self.clusters[entrance.region]
+        if cluster not in self.crossings:
+            self.crossings[cluster] = dict()
+        if entrance not in self.crossings[cluster]:
+            exits = dict()
+            distances = {entrance: 0}
+            frontier = [(0, entrance)]
+            while len(frontier) > 0:
+                (current_cost, current) = heappop(frontier)
+                if current_cost > distances[current] or current in exits:
+                    continue
+                if self.clusters[current.region] != cluster:
+                    exits[current] = current_cost
+                    continue
+                for next_region in self.entrances.get(current.region, ()):
+                    for next_entrance in self.entrances[current.region][next_region].values():
+                        entrance_cost = current_cost + next_entrance.distance(current)
+                        if next_entrance not in distances or distances[next_entrance] > entrance_cost:
+                            distances[next_entrance] = entrance_cost
+                            heappush(frontier, (entrance_cost, next_entrance))
+            self.crossings[cluster][entrance] = exits
+        return self.crossings[cluster][entrance]
+
+    def search(self, source, targets):
+        """Find shortest paths from the source to the targets, entrance by entrance within the clusters holding them and from entrance to exit across others."""
+        regions = group(targets)
+        nearby = {self.clusters.get(source.region)} | {self.clusters.get(region) for region in regions}
+
+        # Initialize search data
+        predecessors = {source: None}
+        distances = {source: 0}
+        frontier = [(0, source)]
+        done = set()
+
+        # Traverse the graph
+        while len(frontier) > 0:
+            (current_cost, current) = heappop(frontier)
+            if current not in done:
+                done.add(current)
+
+                # Improve paths to targets in this region
+                if current.region in regions:
+                    for obj in regions[current.region]:
+                        obj_cost = current_cost + obj.distance(current)
+                        if obj not in distances or distances[obj] > obj_cost:
+                            predecessors[obj] = current
+                            distances[obj] = obj_cost
+
+                # Check neighboring regions, or the exits of a cluster without targets
+                if self.clusters.get(current.region) in nearby:
+                    steps = [(entrance, entrance.distance(current)) for next_region in self.entrances.get(current.region, ()) for entrance in self.entrances[current.region][next_region].values()]
+                else:
+                    steps = self.crossing(current).items()
+                for entrance, cost in steps:
+                    entrance_cost = current_cost + cost
+
+                    # Improve paths to entrances, so that a crossed cluster leaves its exits pointing straight back to its entrance
+                    if entrance not in distances or distances[entrance] > entrance_cost:
+                        predecessors[entrance] = current
+                        distances[entrance] = entrance_cost
+                        heappush(frontier, (entrance_cost, entrance))
+
+        return Search(predecessors, distances)
+
+
+class Passages(object):
+    """Mergeable summary of a sequence of transitions between regions, keeping the first location at which each region was entered from each other."""
+
+    def __init__(self, transitions=()):
+        self.entrances = dict()  # Location of the first transition for each (previous, current) pair of regions, in order
+        for previous, current, location in transitions:
+            self.add(previous, current, location)
+
+    def add(self, previous, current, location):
+        """Summarize one more transition."""
+        if (previous, current) not in self.entrances:
+            self.entrances[previous, current] = location
+
+    def observe(self, record):
+        """Summarize the transitions in every frame of the given record."""
+        for frame in record:
+            for previous, current, location in movements(frame):
+                self.add(previous, current, location)
+
+    def transitions(self):
+        """Return a list of the summarized (previous, current, location) transitions, in order."""
+        return [(previous, current, location) for (previous, current), location in self.entrances.items()]
+
+    def merge(self, other):
+        """Return a summary of the transitions summarized here followed by those summarized by the other passages."""
+        merged = Passages(self.transitions())
+        for previous, current, location in other.transitions():
+            merged.add(previous, current, location)
+        return merged
+
+
 class Search(object):
     """Result of a map search."""
 
@@ -106,3 +245,65 @@ class Search(object):
         while self.predecessors[checkpoint] != objective.actor:
             checkpoint = self.predecessors[checkpoint]
         return Event("checkpoint", objective.actor, checkpoint)
+
+
+class Index(object):
+    """Grid buckets over object locations, for radius queries by Manhattan distance."""
+
+    def __init__(self, locations, cell=CELL):
+        self.locations = locations  # Location of each object
+        self.cell = cell
+        self.buckets = dict()
+        for obj, location in locations.items():
+            key = self.key(location)
+            if key not in self.buckets:
+                self.buckets[key] = [obj]
+            else:
+                self.buckets[key].append(obj)
+
+    def key(self, location):
+        """Return the bucket containing the given location."""
+        return tuple([c // self.cell for c in location])
+
+    def distance(self, obj, location):
+        """Return the Manhattan distance from the given object to the given location."""
+        return sum([abs(a - b) for a, b in zip(self.locations[obj], location)])
+
+    def within(self, location, radius, object_type=None):
+        """Return a list of objects, optionally of the given type, no farther than the radius from the given location."""
+        low = self.key(tuple(c - radius for c in location))
+        high = self.key(tuple(c + radius for c in location))
+        found = list()
+        for key in product(*(range(a, b + 1) for a, b in zip(low, high))):
+            for obj in self.buckets.get(key, ()):
+                if (object_type is None or obj.type == object_type) and self.distance(obj, location) <= radius:
+                    found.append(obj)
+        return found
+
+
+def movements(frame):
+    """Return a list of (previous, current, location) transitions of objects between known regions in the given frame."""
+    transitioned = frame.changes.transitioned
+    if len(transitioned) == 0:
+        return []
+
+    # In the order of the frame's objects, which decides the entrance kept when several objects cross at once
+    found = list()
+    for obj in frame.objects:
+        if obj in transitioned:
+            previous, current = frame.previous.regions[obj], frame.regions[obj]
+            if previous is not None and current is not None:
+                found.append((previous, current, frame.locations[obj]))
+    return found
+
+
+def group(targets):
+    """Return a dictionary of the given targets in each region, ignoring None."""
+    regions = dict()
+    for obj in targets:
+        if obj is not None:
+            if obj.region not in regions:
+                regions[obj.region] = {obj}
+            else:
+                regions[obj.region].add(obj)
+    return regions
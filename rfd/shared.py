@@ -0,0 +1,228 @@
+"""Tools for sharing Q-functions among processes."""
+
+import numpy as np
+
+from copy import copy
+from multiprocessing import get_context, resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from pickle import loads
+
+from rfd.qfunction import QFunction, encode, digest
+
+CAPACITY = 2**14  # Default number of states per table
+KEY_SIZE = 64  # Bytes reserved for each encoded state
+GROWTH = 0.75  # Fraction of capacity at which share replaces a table with a larger one
+
+POLICIES = ("routes", "tactics", "reflexes")  # Agent attributes holding Q-functions
+
+LOCK = get_context("fork").Lock()  # Guards claiming slots, inherited by forked workers since inserts are rare
+
+
+class SharedQFunction(QFunction):
+    """Q-function kept in shared memory as fixed-layout arrays, which processes read and update without locks except when claiming a slot."""
+
+    def __init__(self, actions, capacity=CAPACITY, alpha=1.0, gamma=1.0, key_size=KEY_SIZE):
+        QFunction.__init__(self, alpha, gamma)
+        self.actions = list(actions)
+        self.capacity = capacity
+        self.key_size = key_size
+
+        # Open addressing with at most half of the slots in use
+        self.slots = 1
+        while self.slots < 2 * capacity:
+            self.slots *= 2
+
+        self.memory = SharedMemory(create=True, size=self.size())
+        self.name = self.memory.name
+        self.owner = True
+        self.attach()
+
+    def __getstate__(self):
+        """Pickle only the layout and the name of the shared memory, so that other processes attach to the same table."""
+        state = self.__dict__.copy()
+        for attribute in ("memory", "header", "digests", "table", "seen", "keys", "indices", "rows", "q"):
+            del state[attribute]
+        state["owner"] = False
+        return state
+
+    def __setstate__(self, state):
+        """Attach to the shared memory named in the given state."""
+        self.__dict__.update(state)
+        self.memory = SharedMemory(name=self.name)
+        track(self.memory, False)  # Freeing is left to the creator
+        self.attach()
+
+    def __len__(self):
+        """Return the number of states in this table."""
+        return int(self.header[0])
+
+    def size(self):
+        """Return the number of bytes in the shared memory layout."""
+        return 8 * (2 + self.slots + self.slots * len(self.actions)) + self.slots * (len(self.actions) + self.key_size)
+
+    def attach(self):
+        """Lay out arrays over the shared memory."""
+        n, a = self.slots, len(self.actions)
+        buffer = self.memory.buf
+        self.header = np.ndarray(2, dtype=np.int64, buffer=buffer)  # States and overflows
+        self.digests = np.ndarray(n, dtype=np.int64, buffer=buffer, offset=16)
+        self.table = np.ndarray((n, a), dtype=np.float64, buffer=buffer, offset=16 + 8*n)
+        self.seen = np.ndarray((n, a), dtype=np.uint8, buffer=buffer, offset=16 + 8*n + 8*n*a)
+        self.keys = np.ndarray((n, self.key_size), dtype=np.uint8, buffer=buffer, offset=16 + 8*n + 9*n*a)
+
+        # Local to each process
+        self.indices = {action: i for i, action in enumerate(self.actions)}
+        self.rows = dict()  # Slot found for each state
+        self.q = dict()  # Unused, but present like any QFunction
+
+    def detach(self):
+        """Stop using the shared memory in this process."""
+        del self.header, self.digests, self.table, self.seen, self.keys
+        self.memory.close()
+
+    def release(self):
+        """Stop using the shared memory, and free it if this process created it."""
+        self.detach()
+        if self.owner:
+            track(self.memory, True)  # Attaching in a process with the same tracker may have unregistered it
+            self.memory.unlink()
+
+    def overflows(self):
+        """Return the number of updates dropped because the table was full."""
+        return int(self.header[1])
+
+    def find(self, s, insert=False):
+        """Return the slot for the given state, optionally claiming one, or -1 if there is none."""
+        if s in self.rows:
+            return self.rows[s]
+
+        code = digest(s)
+        key = encode(s)
+        mask = self.slots - 1
+        slot = code & mask
+        for probe in range(self.slots):
+            current = self.digests[slot]
+            if current == 0 and insert:
+                current = self.claim(slot, code, key)
+            if current == 0:
+                return -1
+            elif current == code and self.keys[slot].tobytes() == key.ljust(self.key_size, b"\0"):
+                self.rows[s] = slot
+                return slot
+            slot = (slot + 1) & mask
+        return -1
+
+    def claim(self, slot, code, key):
+        """Publish the given key in the slot unless another process claimed it first, and return the digest now in the slot."""
+        with LOCK:
+            current = self.digests[slot]
+            if current != 0:
+                return current
+            if len(key) > self.key_size:
+                raise ValueError("State encodes to {} bytes, more than the key size of {}".format(len(key), self.key_size))
+            if self.header[0] >= self.capacity:
+                self.header[1] += 1
+                return 0
+
+            # The key goes in before the digest, so that readers never match a slot without its key
+            self.keys[slot, :len(key)] = np.frombuffer(key, dtype=np.uint8)
+            self.digests[slot] = code
+            self.header[0] += 1
+            return code
+
+    def Q(self, s, a):
+        """Return a Q-value estimate for the given step."""
+        slot = self.find(s)
+        return 0 if slot < 0 else float(self.table[slot, self.indices[a]])
+
+    def values(self, s, actions):
+        """Return a list of Q-value estimates for the given state and each of the given actions."""
+        slot = self.find(s)
+        if slot < 0:
+            return [0] * len(actions)
+        row = self.table[slot].tolist()
+        return [row[self.indices[a]] for a in actions]
+
+    def update(self, s, a, r, sp=None, actions=None):
+        """Update a Q-value based on the given observation, unless the table is full."""
+        delta = self.delta(s, a, r, sp, actions)
+        slot = self.find(s, insert=True)
+        if slot >= 0:
+            i = self.indices[a]
+            self.table[slot, i] += self.alpha * delta
+            self.seen[slot, i] = 1
+
+    def export(self):
+        """Return an ordinary QFunction with the same values."""
+        q = QFunction(self.alpha, self.gamma)
+        for attribute in ("epsilon", "beta"):
+            if hasattr(self, attribute):
+                setattr(q, attribute, getattr(self, attribute))
+
+        # Copy first, since other processes may be adding states
+        digests, table, seen, keys = self.digests.copy(), self.table.copy(), self.seen.copy(), self.keys.copy()
+        for slot in np.flatnonzero(digests):
+            row = {a: float(table[slot, i]) for i, a in enumerate(self.actions) if seen[slot, i]}
+            if len(row) > 0:
+                q.q[loads(keys[slot].tobytes())] = row
+        return q
+
+    @staticmethod
+    def load(q, actions, capacity=CAPACITY, key_size=KEY_SIZE):
+        """Return a shared copy of the given ordinary QFunction."""
+        shared = SharedQFunction(actions, capacity, q.alpha, q.gamma, key_size)
+        for attribute in ("epsilon", "beta"):
+            if hasattr(q, attribute):
+                setattr(shared, attribute, getattr(q, attribute))
+
+        for s, row in q.q.items():
+            slot = shared.find(s, insert=True)
+            if slot >= 0:
+                for a, value in row.items():
+                    shared.table[slot, shared.indices[a]] = value
+                    shared.seen[slot, shared.indices[a]] = 1
+        return shared
+
+
+def track(memory, tracked):
+    """Register or unregister the given shared memory with the resource tracker of this process."""
+
+    # Works around CPython issue gh-82300 (bpo-38119): the tracker of every process that attaches to shared memory
+    # unlinks it when that process exits, even while its creator still uses it
+    if tracked:
+        resource_tracker.register(memory._name, "shared_memory")
+    else:
+        resource_tracker.unregister(memory._name, "shared_memory")
+
+
+def share(agent, actions, capacity=CAPACITY):
+    """Move each of the agent's Q-functions into shared memory, and return any nearly full tables replaced by larger ones, to release once no process uses them."""
+    replaced = list()
+    for policies in POLICIES:
+        collection = getattr(agent, policies)
+        for template, q in collection.items():
+            if not isinstance(q, SharedQFunction):
+                collection[template] = SharedQFunction.load(q, actions, max(capacity, 2 * len(q.q)))
+            elif len(q) > GROWTH * q.capacity:
+                collection[template] = SharedQFunction.load(q.export(), actions, 2 * q.capacity, q.key_size)
+                replaced.append(q)
+    return replaced
+
+
+def unshare(agent):
+    """Move each of the agent's Q-functions back into ordinary dictionaries and free the shared memory."""
+    for policies in POLICIES:
+        collection = getattr(agent, policies)
+        for template, q in collection.items():
+            if isinstance(q, SharedQFunction):
+                collection[template] = q.export()
+                q.release()
+
+
+def exported(agent):
+    """Return a shallow copy of the agent with ordinary Q-functions, suitable for saving."""
+    copied = copy(agent)
+    for policies in POLICIES:
+        collection = getattr(agent, policies)
+        setattr(copied, policies, {template: q.export() if isinstance(q, SharedQFunction) else q for template, q in collection.items()})
+    return copied
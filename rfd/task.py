@@ -1,14 +1,20 @@
 """Tools for defining and recording tasks."""
 
+from functools import cached_property
 from pickle import dump
 
 from rfd.event import Event
+from rfd.search import Index
 
 
 class TaskInterface(object):
     """Superclass for task definitions."""
 
     def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Start a new attempt, keeping any environment (overrides reset task state and then call this)."""
         self.record = list()
         self.frame = Frame(None, self.objects(), set(), False, False)
 
@@ -28,7 +34,7 @@ class TaskInterface(object):
 
     def update(self):
         """Add to the record of this attempt."""
-        self.frame = Frame(self.frame, self.objects(), self.events(), self.succeeded(), self.failed())
+        self.frame = Frame(self.frame, self.objects(), self.events(), self.succeeded(), self.failed(), self.layout())
         self.record.append(self.frame)
 
     def actions(self):
@@ -39,6 +45,12 @@ class TaskInterface(object):
         """Perform the given action."""
         raise NotImplementedError
 
+    @staticmethod
+    def perform_all(tasks, actions):
+        """Perform one action in each of the given tasks (overrides may step shared environments together)."""
+        for task, action in zip(tasks, actions):
+            task.perform(action)
+
     def objects(self):
         """Return a set of perceived objects."""
         raise NotImplementedError
@@ -47,6 +59,10 @@ class TaskInterface(object):
         """Return a set of perceived events."""
         raise NotImplementedError
 
+    def layout(self):
+        """Return a Snapshot of the perceived objects, or None to have the frame read one from the objects (overrides may supply precomputed arrays)."""
+        return None
+
     def succeeded(self):
         """Return whether this attempt has succeeded."""
         raise NotImplementedError
@@ -76,31 +92,119 @@ class TaskInterface(object):
         raise NotImplementedError
 
 
+class TaskPool(object):
+    """Task generator that resets finished tasks rather than building new ones."""
+
+    def __init__(self, task_generator):
+        self.task_generator = task_generator
+        self.tasks = list()
+
+    def __call__(self):
+        """Return a task ready for a new attempt."""
+        if len(self.tasks) > 0:
+            task = self.tasks.pop()
+            task.reset()
+            return task
+        else:
+            return self.task_generator()
+
+    def release(self, task):
+        """Return a finished task to the pool."""
+        self.tasks.append(task)
+
+
+class Snapshot(object):
+    """Regions and locations of objects at one step, kept as sequences in the same order until a frame needs them as dictionaries."""
+
+    def __init__(self, objects, regions, locations):
+        self.objects = objects
+        self.regions = regions
+        self.locations = locations  # Tuples, or rows of an array
+
+    def region_map(self):
+        """Return a dictionary from each object to its region."""
+        regions = self.regions.tolist() if hasattr(self.regions, "tolist") else self.regions
+        return dict(zip(self.objects, regions))
+
+    def location_map(self):
+        """Return a dictionary from each object to its location as a tuple."""
+        if hasattr(self.locations, "tolist"):
+            return dict(zip(self.objects, map(tuple, self.locations.tolist())))
+        return dict(zip(self.objects, self.locations))
+
+
+class Changes(object):
+    """Objects that appeared, disappeared or changed region in one frame."""
+
+    def __init__(self, appeared, disappeared, transitioned):
+        self.appeared = appeared
+        self.disappeared = disappeared
+        self.transitioned = transitioned
+
+    def __len__(self):
+        """Return the number of changes, so that a quiet frame has none."""
+        return len(self.appeared) + len(self.disappeared) + len(self.transitioned)
+
+
 class Frame(object):
     """Recorded step in a task attempt."""
 
-    def __init__(self, previous, objects, events, success, failure):
+    def __init__(self, previous, objects, events, success, failure, snapshot=None):
         self.previous = previous
 
-        # Object record
+        # Object record, laid out and turned into region and location dictionaries when first needed; tasks move their
+        # objects in place, so only the region and location of each object are read now, in the order of the set
         self.objects = objects
-        self.regions = {obj: obj.region for obj in objects}
-        self.locations = {obj: obj.location for obj in objects}
+        if snapshot is None:
+            self.values = ([obj.region for obj in objects], [obj.location for obj in objects])
+        else:
+            self.snapshot = snapshot
 
         # Event record
         self.events = events
         self.success = success
         self.failure = failure
 
+    def __getstate__(self):
+        """Pickle with the snapshot laid out, since a set of unpickled objects may iterate in another order."""
+        self.snapshot
+        state = self.__dict__.copy()
+        state.pop("values", None)
+        return state
+
+    @cached_property
+    def snapshot(self):
+        """Return the regions and locations of the objects in this frame as sequences in the same order."""
+        return Snapshot(list(self.objects), *self.values)
+
+    # Built on first access and then kept like ordinary attributes, which frames saved before snapshots already have
+    @cached_property
+    def regions(self):
+        """Return a dictionary from each object to its region."""
+        return self.snapshot.region_map()
+
+    @cached_property
+    def locations(self):
+        """Return a dictionary from each object to its location."""
+        return self.snapshot.location_map()
+
+    @cached_property
+    def changes(self):
+        """Return the objects that appeared, disappeared or changed region in this frame."""
+        if self.previous is None:
+            return Changes(set(), set(), set())
+        appeared = self.objects - self.previous.objects
+        disappeared = self.previous.objects - self.objects
+
+        # Objects present in both frames that changed region
+        regions = self.regions
+        previous = self.previous.regions
+        transitioned = {obj for obj in self.objects if obj in previous and regions[obj] != previous[obj]}
+        return Changes(appeared, disappeared, transitioned)
+
     def observations(self):
         """Return a set of any appearances and endings that occurred in this frame."""
-        observations = set()
-
-        # Appearances
-        if self.previous is not None:
-            for obj in self.objects:
-                if obj not in self.previous.objects:
-                    observations.add(obj.type)
+        observations = {obj.type for obj in self.changes.appeared}
 
         # Endings
         if self.success:
@@ -112,7 +216,7 @@ class Frame(object):
 
     def transitions(self, obj):
         """Return whether the given object changed its region in this frame."""
-        return obj in self.objects and obj in self.previous.objects and self.regions[obj] != self.previous.regions[obj]
+        return obj in self.changes.transitioned
 
     def supports(self, objective):
         """Return whether the given objective is pursuable in this frame."""
@@ -121,11 +225,18 @@ class Frame(object):
         else:
             return {objective.actor, objective.subject} <= self.objects
 
-    def objectives(self, template):
-        """Return a set of objectives that match the given event template."""      
+    @cached_property
+    def index(self):
+        """Return a spatial index over the objects in this frame."""
+        return Index(self.locations)
+
+    def objectives(self, template, horizon=None):
+        """Return a set of objectives that match the given event template, optionally only those whose objects are within the horizon of each other."""
         actors = {obj for obj in self.objects if obj.type == template.actor_type}
         if template.subject_type is None:
             return {Event(template.type, actor, None) for actor in actors}
+        elif horizon is not None:
+            return {Event(template.type, a, s) for a in actors for s in self.index.within(self.locations[a], horizon, template.subject_type) if a != s}
         else:
             subjects = {obj for obj in self.objects if obj.type == template.subject_type}
             return {Event(template.type, a, s) for a in actors for s in subjects if a != s}
@@ -18,11 +18,33 @@ class Theory(object):
 
     def update(self, frame):
         """Adjust hypotheses based on the given frame."""
+        if len(frame.events) == 0:
+            return  # Without causes, neither expansion nor contraction changes anything
         causes = {event.template for event in frame.events}
         effects = frame.observations()
         self.expand(causes, effects)
         self.contract(causes, effects)
 
+    def observe(self, record):
+        """Adjust hypotheses based on every frame of the given record, as updating with each frame in turn would."""
+        evidence = Evidence()
+        evidence.observe(record)
+        self.adopt(evidence)
+
+    def learn(self, experiences):
+        """Adjust hypotheses based on a sequence of (causes, effects) pairs, as expanding and contracting with each in turn would."""
+        self.adopt(Evidence(experiences))
+
+    def adopt(self, evidence):
+        """Adjust hypotheses based on summarized evidence, as expanding and contracting with each pair it summarizes would."""
+        for causes, effects in evidence.introductions:
+            self.expand(causes, effects)
+
+        # A cause survives for an effect only if the effect accompanied every occurrence of the cause
+        for effect in self.hypotheses:
+            implausible = {cause for cause in self.hypotheses[effect] if cause in evidence.consistent and effect not in evidence.consistent[cause]}
+            self.hypotheses[effect] -= implausible
+
     def expand(self, causes, effects):
         """Add plausible hypotheses."""
         for cause in causes:
@@ -57,3 +79,38 @@ class Theory(object):
                 for object_type in missing:
                     templates |= self.contributors(object_type, frame, ancestors | {effect})
         return templates
+
+
+class Evidence(object):
+    """Mergeable summary of a sequence of (causes, effects) pairs, from which a theory learns as it would from the pairs themselves."""
+
+    def __init__(self, experiences=()):
+        self.introductions = list()  # Pairs in which some cause occurred for the first time, in order
+        self.consistent = dict()  # Effects seen with every occurrence of each cause
+        for causes, effects in experiences:
+            self.add(causes, effects)
+
+    def add(self, causes, effects):
+        """Summarize one more pair."""
+        if any(cause not in self.consistent for cause in causes):
+            self.introductions.append((causes, effects))
+        for cause in causes:
+            if cause in self.consistent:
+                self.consistent[cause] = self.consistent[cause] & effects
+            else:
+                self.consistent[cause] = set(effects)
+
+    def observe(self, record):
+        """Summarize the causes and effects in every frame of the given record that has events."""
+        for frame in record:
+            if len(frame.events) > 0:
+                self.add({event.template for event in frame.events}, frame.observations())
+
+    def merge(self, other):
+        """Return a summary of the pairs summarized here followed by those summarized by the other evidence."""
+        merged = Evidence()
+        merged.introductions = self.introductions + [(causes, effects) for causes, effects in other.introductions if any(cause not in self.consistent for cause in causes)]
+        merged.consistent = dict(self.consistent)
+        for cause, effects in other.consistent.items():
+            merged.consistent[cause] = merged.consistent[cause] & effects if cause in merged.consistent else set(effects)
+        return merged
@@ -0,0 +1,77 @@
+"""Tools for timing the phases of task attempts."""
+
+from math import log2
+from time import perf_counter
+
+RESOLUTION = 16  # Histogram buckets per doubling of latency
+
+enabled = False  # Whether phases are being timed
+phases = dict()  # Statistics for each phase since the last reset
+
+
+class Phase(object):
+    """Cumulative time, call count and latency histogram of one phase."""
+
+    def __init__(self):
+        self.total = 0.0
+        self.count = 0
+        self.histogram = dict()  # Calls in each logarithmic latency bucket
+
+    def add(self, elapsed):
+        """Count one call that took the given number of seconds."""
+        self.total += elapsed
+        self.count += 1
+        bucket = int(RESOLUTION * log2(elapsed)) if elapsed > 0 else -64 * RESOLUTION
+        self.histogram[bucket] = self.histogram.get(bucket, 0) + 1
+
+    def percentile(self, p):
+        """Return the latency in seconds that the given percentage of calls did not exceed, rounded up to a bucket boundary."""
+        threshold = p / 100 * self.count
+        running = 0
+        for bucket in sorted(self.histogram):
+            running += self.histogram[bucket]
+            if running >= threshold:
+                return 2 ** ((bucket + 1) / RESOLUTION)
+        return 0.0
+
+
+def enable():
+    """Start timing phases, discarding earlier statistics."""
+    global enabled
+    enabled = True
+    reset()
+
+
+def disable():
+    """Stop timing phases."""
+    global enabled
+    enabled = False
+
+
+def reset():
+    """Discard the statistics gathered so far."""
+    phases.clear()
+
+
+def clock():
+    """Return the current time if timing is enabled, or zero."""
+    return perf_counter() if enabled else 0
+
+
+def lap(phase, start):
+    """Count the time since the given start against the named phase if timing is enabled, and return the current time."""
+    if not enabled:
+        return 0
+    now = perf_counter()
+    if phase not in phases:
+        phases[phase] = Phase()
+    phases[phase].add(now - start)
+    return now
+
+
+def summary(attempts):
+    """Return lines reporting each phase, averaged over the given number of attempts, with call latency percentiles."""
+    lines = ["  {:<20}{:>12}{:>12}{:>12}{:>12}".format("phase", "calls", "ms", "p50 us", "p99 us")]
+    for name, phase in sorted(phases.items()):
+        lines.append("  {:<20}{:>12.1f}{:>12.2f}{:>12.1f}{:>12.1f}".format(name, phase.count / attempts, 1e3 * phase.total / attempts, 1e6 * phase.percentile(50), 1e6 * phase.percentile(99)))
+    return "\n".join(lines)
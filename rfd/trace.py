@@ -0,0 +1,143 @@
+"""Tools for recording what an agent does at each step, for offline analysis."""
+
+import gzip
+import json
+
+from queue import Queue
+from threading import Thread
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+BUFFER = 1024  # Steps held before they are handed to the writer thread
+
+sink = None  # Trace receiving steps, when one has been started
+
+
+class Trace(object):
+    """Sink that writes sampled steps as JSON lines, optionally gzipped, on a background thread."""
+
+    def __init__(self, filename, attempts=1, steps=1, buffer=BUFFER):
+        self.attempts = attempts  # Record every this many attempts
+        self.steps = steps  # Record every this many steps in a recorded attempt
+        self.buffer = buffer
+        self.count = 0  # Attempts begun
+        self.numbers = [0]  # Numbers of the attempts in progress, by position in a batch
+        self.lines = list()
+
+        if filename.endswith(".gz"):
+            self.file = gzip.open(filename, "wt")
+        else:
+            self.file = open(filename, "w")
+        self.queue = Queue()
+        self.writer = Thread(target=self.write, daemon=True)
+        self.writer.start()
+
+    def begin(self, n=1):
+        """Number the given number of new attempts, made one at a time or in lockstep."""
+        self.numbers = list(range(self.count + 1, self.count + n + 1))
+        self.count += n
+
+    def sampled(self, attempt, step):
+        """Return whether the given step of the given attempt should be recorded."""
+        return attempt % self.attempts == 0 and step % self.steps == 0
+
+    def record(self, step):
+        """Queue a dictionary describing one step."""
+        self.lines.append(json.dumps(step, separators=(",", ":"), default=str))
+        if len(self.lines) >= self.buffer:
+            self.flush()
+
+    def flush(self):
+        """Hand the queued steps to the writer thread."""
+        if len(self.lines) > 0:
+            self.queue.put(self.lines)
+            self.lines = list()
+
+    def write(self):
+        """Write queued steps until told to stop."""
+        while True:
+            lines = self.queue.get()
+            if lines is None:
+                break
+            self.file.write("\n".join(lines) + "\n")
+
+    def close(self):
+        """Write any remaining steps and close the file."""
+        self.flush()
+        self.queue.put(None)
+        self.writer.join()
+        self.file.close()
+
+
+def start(filename, attempts=1, steps=1, buffer=BUFFER):
+    """Start recording steps of every agent to the named file, sampling every given number of attempts and steps."""
+    global sink
+    stop()
+    sink = Trace(filename, attempts, steps, buffer)
+
+
+def stop():
+    """Finish recording steps, if a trace was started."""
+    global sink
+    if sink is not None:
+        sink.close()
+        sink = None
+
+
+def step(attempt, task, action, objective, checkpoint, actions, rewards, risks, deltas):
+    """Return a dictionary describing the step just taken in the given task."""
+    return {
+        "attempt": attempt,
+        "step": len(task.record),
+        "objective": None if objective is None else str(objective),
+        "checkpoint": None if checkpoint is None else checkpoint.subject.region,
+        "action": action,
+        "actions": actions,
+        "rewards": [rewards[a] for a in actions],
+        "risks": [risks[a] for a in actions],
+        "deltas": deltas,
+        "events": sorted(str(event) for event in task.frame.events),
+        "success": task.frame.success,
+        "failure": task.frame.failure,
+    }
+
+
+def load(filename):
+    """Return a dictionary of NumPy arrays with one entry per recorded step, using object arrays for lists and labels."""
+    if np is None:
+        raise ImportError("Loading traces requires NumPy")
+
+    f = gzip.open(filename, "rt") if filename.endswith(".gz") else open(filename)
+    steps = [json.loads(line) for line in f if len(line.strip()) > 0]
+    f.close()
+
+    def column(name, dtype=object):
+        values = [step[name] for step in steps]
+        if dtype is object:
+            array = np.empty(len(values), dtype=object)
+            for i, value in enumerate(values):
+                array[i] = value
+            return array
+        return np.array(values, dtype=dtype)
+
+    chosen = [step["actions"].index(step["action"]) if step["action"] in step["actions"] else -1 for step in steps]
+    return {
+        "attempt": column("attempt", np.int64),
+        "step": column("step", np.int64),
+        "objective": column("objective"),
+        "checkpoint": column("checkpoint"),
+        "action": column("action"),
+        "actions": column("actions"),
+        "rewards": column("rewards"),
+        "risks": column("risks"),
+        "deltas": column("deltas"),
+        "events": column("events"),
+        "success": column("success", bool),
+        "failure": column("failure", bool),
+        "reward": np.array([step["rewards"][i] if i >= 0 else np.nan for step, i in zip(steps, chosen)], dtype=np.float64),
+        "risk": np.array([step["risks"][i] if i >= 0 else np.nan for step, i in zip(steps, chosen)], dtype=np.float64),
+        "delta": np.array([sum(abs(d) for d in step["deltas"]) for step in steps], dtype=np.float64),
+    }
@@ -0,0 +1,201 @@
+"""Courier environments stepped together through NumPy arrays."""
+
+import numpy as np
+
+from tasks.courier.courier import Environment, Courier, Platform, ROWS, COLS, PACKAGES, VEHICLES
+from rfd.event import Event
+
+# Row and column changes for each action
+DELTAS = {None: (0, 0), "up": (-1, 0), "down": (1, 0), "left": (0, -1), "right": (0, 1)}
+
+# Row changes for each vehicle direction
+DIRECTIONS = {"up": -1, "down": 1}
+
+
+class BatchEnvironment(object):
+    """Independent Courier environments, each presented through its own view."""
+
+    def __init__(self, n, rows=ROWS, cols=COLS, packages=PACKAGES, vehicles=VEHICLES):
+        self.n = n
+        self.rows = rows
+        self.cols = cols
+        self.package_count = packages
+        self.vehicle_count = vehicles
+
+        # Shared walls as a grid
+        self.walls = np.zeros((rows, cols), dtype=bool)
+        for location in Environment(rows, cols).walls:
+            self.walls[location] = True
+
+        # Couriers
+        self.couriers = np.zeros((n, 2), dtype=np.int64)
+        self.carried = np.zeros(n, dtype=np.int64)  # Packages held by each courier
+        self.delivered = np.zeros(n, dtype=np.int64)  # Packages on each platform
+        self.dead = np.zeros(n, dtype=bool)
+        self.platforms = np.zeros((n, 2), dtype=np.int64)
+
+        # Vehicles and packages, in the order kept by each view
+        self.vehicles = np.zeros((n, vehicles, 2), dtype=np.int64)
+        self.directions = np.zeros((n, vehicles), dtype=np.int64)
+        self.packages = np.zeros((n, packages, 2), dtype=np.int64)
+        self.collected = np.zeros((n, packages), dtype=bool)
+        self.stale = np.zeros(n, dtype=bool)  # Whether vehicle objects lag behind the arrays
+
+        self.views = [EnvironmentView(self, i) for i in range(n)]
+
+    def reset(self):
+        """Place the couriers, packages and vehicles in every environment for new attempts."""
+        for view in self.views:
+            view.reset()
+
+    def step(self, actions, mask=None):
+        """Execute one action per environment, or only in the environments selected by the mask, and return a list of event sets."""
+        mask = np.ones(self.n, dtype=bool) if mask is None else np.asarray(mask, dtype=bool)
+        deltas = np.array([DELTAS[action] for action in actions], dtype=np.int64)
+        hits = np.full(self.n, -1)  # Vehicle struck in each environment
+
+        # Player movement
+        alive = mask & ~self.dead
+        proposed = self.couriers + deltas
+        moving = alive & ~self.walls[proposed[:, 0], proposed[:, 1]]
+        self.couriers[moving] = proposed[moving]
+        crashes = moving[:, None] & (self.vehicles == self.couriers[:, None, :]).all(axis=2)
+        crashed = crashes.any(axis=1)
+        hits[crashed] = crashes[crashed].argmax(axis=1)
+
+        # Vehicle movement, wrapping around without a collision check
+        driving = mask & ~crashed
+        rows = self.vehicles[:, :, 0] + self.directions
+        wrapped = (rows < 0) | (rows == self.rows)
+        rows %= self.rows
+        self.vehicles[driving, :, 0] = rows[driving]
+        crashes = (alive & driving)[:, None] & ~wrapped & (self.vehicles == self.couriers[:, None, :]).all(axis=2)
+        crashed = crashes.any(axis=1)
+        hits[crashed] = crashes[crashed].argmax(axis=1)
+        self.dead |= hits >= 0
+
+        # Vehicles after a collision stay put, as they do when Environment.step returns early
+        later = crashed[:, None] & (np.arange(self.vehicle_count) > hits[:, None])
+        self.vehicles[:, :, 0][later] = (rows - self.directions)[later] % self.rows
+
+        # Package collection and delivery
+        collecting = alive & (hits < 0)
+        arrivals = collecting[:, None] & ~self.collected & (self.packages == self.couriers[:, None, :]).all(axis=2)
+        delivering = collecting & (self.couriers == self.platforms).all(axis=1)
+        self.collected |= arrivals
+        self.carried += arrivals.sum(axis=1)
+        unloading = delivering & (self.carried > 0)
+        self.delivered[unloading] += self.carried[unloading]
+
+        # Objects and events only where something happened
+        self.stale |= mask
+        events = [set() for i in range(self.n)]
+        for i in np.flatnonzero((hits >= 0) | arrivals.any(axis=1) | delivering):
+            events[i] = self.views[i].settle(hits[i], arrivals[i], delivering[i])
+        self.carried[unloading] = 0
+        return events
+
+    def perform(self, tasks, actions):
+        """Perform one action in each of the given Courier tasks, whose environments are views of this batch, in a single step."""
+        batch_actions = [None] * self.n
+        mask = np.zeros(self.n, dtype=bool)
+        for task, action in zip(tasks, actions):
+            batch_actions[task.env.index] = action
+            mask[task.env.index] = True
+
+        events = self.step(batch_actions, mask)
+        for task in tasks:
+            task.current_events = events[task.env.index]
+
+
+class EnvironmentView(Environment):
+    """One environment in a batch, presented through the same objects and events as Environment."""
+
+    def __init__(self, batch, index):
+        Environment.__init__(self, batch.rows, batch.cols, batch.package_count, batch.vehicle_count)
+        self.batch = batch
+        self.index = index
+
+    def reset(self):
+        """Place the courier, packages and vehicles for a new attempt."""
+        env = Environment(self.rows, self.cols, self.package_count, self.vehicle_count)
+        env.reset()
+        self.current_courier = env.courier
+        self.platform = env.platform
+        self.packages = env.packages
+        self.vehicle_set = env.vehicles
+
+        # Fix an order for matching objects with array rows
+        self.package_list = list(env.packages)
+        self.vehicle_list = list(env.vehicles)
+
+        i = self.index
+        self.batch.stale[i] = False
+        self.batch.couriers[i] = env.courier.location
+        self.batch.carried[i] = 0
+        self.batch.delivered[i] = 0
+        self.batch.dead[i] = False
+        self.batch.platforms[i] = self.platform.location
+        self.batch.vehicles[i] = [vehicle.location for vehicle in self.vehicle_list]
+        self.batch.directions[i] = [DIRECTIONS[vehicle.velocity] for vehicle in self.vehicle_list]
+        self.batch.packages[i] = [package.location for package in self.package_list]
+        self.batch.collected[i] = False
+
+    @property
+    def courier(self):
+        """Return the courier, moved to its latest location."""
+        if self.batch.stale[self.index]:
+            self.sync()
+        return self.current_courier
+
+    @property
+    def vehicles(self):
+        """Return the set of vehicles, moved to their latest locations."""
+        if self.batch.stale[self.index]:
+            self.sync()
+        return self.vehicle_set
+
+    def sync(self):
+        """Move the courier and vehicle objects to the locations held in the arrays."""
+        location = tuple(self.batch.couriers[self.index].tolist())
+        if location != self.current_courier.location:
+            self.current_courier.location = location
+            self.current_courier.region = self.region(location)
+        for vehicle, location in zip(self.vehicle_list, self.batch.vehicles[self.index].tolist()):
+            vehicle.location = tuple(location)
+        self.batch.stale[self.index] = False
+
+    def step(self, action):
+        """Execute the given action in this environment alone and return a set of events."""
+        actions = [None] * self.batch.n
+        actions[self.index] = action
+        mask = np.zeros(self.batch.n, dtype=bool)
+        mask[self.index] = True
+        return self.batch.step(actions, mask)[self.index]
+
+    def settle(self, hit, arrivals, delivering):
+        """Update objects after a batch step and return a set of events."""
+        events = set()
+        self.sync()
+
+        # Collision
+        if hit >= 0:
+            events.add(Event("collides", self.current_courier, self.vehicle_list[hit]))
+            self.current_courier.dead = True
+            return events
+
+        # Package collection
+        for j in np.flatnonzero(arrivals):
+            package = self.package_list[j]
+            events.add(Event("arrives", self.current_courier, package))
+            self.current_courier = Courier(self.current_courier.location, self.current_courier.region, self.current_courier.packages + 1)
+            self.packages.remove(package)
+
+        # Package delivery
+        if delivering:
+            events.add(Event("arrives", self.current_courier, self.platform))
+            if self.current_courier.packages > 0:
+                self.platform = Platform(self.platform.location, self.platform.region, self.platform.packages + self.current_courier.packages)
+                self.current_courier = Courier(self.current_courier.location, self.current_courier.region)
+
+        return events
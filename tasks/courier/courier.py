@@ -1,11 +1,12 @@
 """Task in which a courier dodges vehicles to collect and deliver packages."""
 
-from random import choice, random
+import numpy as np
 
-from tkinter import Tk, Frame, Canvas
+from random import sample, random
 
 from rfd.task import TaskInterface
 from rfd.event import Event, Object
+from tasks.images import write_sequence, write_gif
 
 # Counts
 ROWS = 35
@@ -25,65 +26,77 @@ SCALE = 16  # Pixels per grid cell in the environment view
 SLOW = 200  # Milliseconds between renders for playability
 FAST = 50  # Milliseconds between renders for watchability
 
+# Colors for headless rendering, matching the canvas fills
+COLORS = {"black": (0, 0, 0), "white": (255, 255, 255), "light blue": (173, 216, 230), "yellow": (255, 255, 0), "red": (255, 0, 0)}
+BACKGROUND = (217, 217, 217)  # Default canvas color
+
 
 class Courier(Object):
-    def __init__(self, location, packages=0):
+    def __init__(self, location, region, packages=0):
         self.dead = False
         self.packages = packages
         object_type = "Courier" + ("" if packages == 0 else "+"+str(packages))
-        Object.__init__(self, object_type, location, region=Environment.region(location))
+        Object.__init__(self, object_type, location, region=region)
 
 
 class Platform(Object):
-    def __init__(self, location, packages=0):
+    def __init__(self, location, region, packages=0):
         self.packages = packages
         object_type = "Platform" + ("" if packages == 0 else "+"+str(packages))
-        Object.__init__(self, object_type, location, region=Environment.region(location))
+        Object.__init__(self, object_type, location, region=region)
 
 
 class Package(Object):
-    def __init__(self, location):
-        Object.__init__(self, "Package", location, region=Environment.region(location))
+    def __init__(self, location, region):
+        Object.__init__(self, "Package", location, region=region)
 
 
 class Vehicle(Object):
-    def __init__(self, location, direction):
-        Object.__init__(self, "Vehicle", location, region=Environment.region(location), velocity=direction)
+    def __init__(self, location, region, direction):
+        Object.__init__(self, "Vehicle", location, region=region, velocity=direction)
 
 
 class Environment(object):
-    def __init__(self):
-        center = (ROWS // 2, COLS // 2)
-        self.courier = Courier(center)
-        self.platform = Platform(center)
-
-        # Set boundaries
-        self.walls = {(r, 0) for r in range(ROWS)}
-        self.walls |= {(0, c) for c in range(COLS)}
-        self.walls |= {(r, COLS - 1) for r in range(ROWS)}
-        self.walls |= {(ROWS - 1, c) for c in range(COLS)}
-        self.walls |= {(r, COLS // 3) for r in range(0, ROWS*2 // 3)}
-        self.walls |= {(r, COLS*2 // 3) for r in range(ROWS // 3, ROWS)}
+    def __init__(self, rows=ROWS, cols=COLS, packages=PACKAGES, vehicles=VEHICLES):
+        """Set boundaries, leaving the rest for reset."""
+        self.rows = rows
+        self.cols = cols
+        self.package_count = packages
+        self.vehicle_count = vehicles
+
+        self.walls = {(r, 0) for r in range(rows)}
+        self.walls |= {(0, c) for c in range(cols)}
+        self.walls |= {(r, cols - 1) for r in range(rows)}
+        self.walls |= {(rows - 1, c) for c in range(cols)}
+        self.walls |= {(r, cols // 3) for r in range(0, rows*2 // 3)}
+        self.walls |= {(r, cols*2 // 3) for r in range(rows // 3, rows)}
+
+    def reset(self):
+        """Place the courier, packages and vehicles for a new attempt."""
+        rows, cols = self.rows, self.cols
+        center = (rows // 2, cols // 2)
+        self.courier = Courier(center, self.region(center))
+        self.platform = Platform(center, self.region(center))
 
         # Distribute packages
-        spots = [(r, c) for r in range(1, ROWS*2 // 3) for c in range(2, COLS//3 - 1)]
-        spots += [(r, c) for r in range(1 + ROWS // 3, ROWS - 1) for c in range(2 + COLS*2 // 3, COLS - 2)]
+        spots = [(r, c) for r in range(1, rows*2 // 3) for c in range(2, cols//3 - 1)]
+        spots += [(r, c) for r in range(1 + rows // 3, rows - 1) for c in range(2 + cols*2 // 3, cols - 2)]
 
-        self.packages = set()
-        while len(self.packages) < PACKAGES:
-            location = choice(spots)
-            spots.remove(location)
-            self.packages.add(Package(location))
+        locations = sample(spots, self.package_count)
+        self.packages = {Package(location, self.region(location)) for location in locations}
+        taken = set(locations)
+        spots = [spot for spot in spots if spot not in taken]
 
         # Distribute vehicles
-        spots += [(r, c) for r in range(ROWS*2 // 3, ROWS - 1) for c in range(2, COLS//3 - 1)]
-        spots += [(r, c) for r in range(1, 1 + ROWS // 3) for c in range(2 + COLS*2 // 3, COLS - 2)]
+        spots += [(r, c) for r in range(rows*2 // 3, rows - 1) for c in range(2, cols//3 - 1)]
+        spots += [(r, c) for r in range(1, 1 + rows // 3) for c in range(2 + cols*2 // 3, cols - 2)]
 
         self.vehicles = set()
-        while len(self.vehicles) < VEHICLES:
-            location = choice(spots)
-            spots.remove(location)
-            self.vehicles.add(Vehicle(location, "up" if location[1] < COLS // 3 else "down"))
+        self.occupants = dict()  # Vehicle at each occupied location
+        for location in sample(spots, self.vehicle_count):
+            vehicle = Vehicle(location, self.region(location), "up" if location[1] < cols // 3 else "down")
+            self.vehicles.add(vehicle)
+            self.occupants[location] = vehicle
 
     def step(self, action):
         """Execute the given action and return a set of events."""
@@ -94,21 +107,21 @@ class Environment(object):
             location = Environment.neighbor(self.courier.location, action)
             if location not in self.walls:
                 self.courier.location = location
-                self.courier.region = Environment.region(location)
-                for vehicle in self.vehicles:
-                    if location == vehicle.location:
-                        events.add(Event("collides", self.courier, vehicle))
-                        self.courier.dead = True
-                        return events
-
-        # Vehicle movement
+                self.courier.region = self.region(location)
+                if location in self.occupants:
+                    events.add(Event("collides", self.courier, self.occupants[location]))
+                    self.courier.dead = True
+                    return events
+
+        # Vehicle movement, leaving cells that another vehicle has already entered
         for vehicle in self.vehicles:
-            vehicle.location = self.neighbor(vehicle.location, vehicle.velocity)
-            if vehicle.location[0] < 0:
-                vehicle.location = (ROWS - 1, vehicle.location[1])
-            elif vehicle.location[0] == ROWS:
-                vehicle.location = (0, vehicle.location[1])
-            elif vehicle.location == self.courier.location:
+            if self.occupants.get(vehicle.location) is vehicle:
+                del self.occupants[vehicle.location]
+            location = self.neighbor(vehicle.location, vehicle.velocity)
+            wrapped = not 0 <= location[0] < self.rows
+            vehicle.location = (location[0] % self.rows, location[1])
+            self.occupants[vehicle.location] = vehicle
+            if not wrapped and vehicle.location == self.courier.location:
                 events.add(Event("collides", self.courier, vehicle))
                 self.courier.dead = True
                 return events
@@ -117,15 +130,15 @@ class Environment(object):
         for package in self.packages.copy():
             if package.location == self.courier.location:
                 events.add(Event("arrives", self.courier, package))
-                self.courier = Courier(self.courier.location, self.courier.packages + 1)
+                self.courier = Courier(self.courier.location, self.courier.region, self.courier.packages + 1)
                 self.packages.remove(package)
 
         # Package delivery
         if self.courier.location == self.platform.location:
             events.add(Event("arrives", self.courier, self.platform))
             if self.courier.packages > 0:
-                self.platform = Platform(self.platform.location, self.platform.packages + self.courier.packages)
-                self.courier = Courier(self.courier.location)
+                self.platform = Platform(self.platform.location, self.platform.region, self.platform.packages + self.courier.packages)
+                self.courier = Courier(self.courier.location, self.courier.region)
         
         return events
 
@@ -143,26 +156,35 @@ class Environment(object):
         else:
             return location
 
-    @staticmethod
-    def region(location):
+    def region(self, location):
         """Return a region label for the given location."""
-        if location[1] < COLS // 3:
+        if location[1] < self.cols // 3:
             return "left"
-        elif location[1] > COLS*2 // 3:
+        elif location[1] > self.cols*2 // 3:
             return "right"
         else:
             return "middle"
 
 
-class View(Frame):
-    def __init__(self):
+class View(object):
+    def __init__(self, rows=ROWS, cols=COLS):
+        from tkinter import Tk, Frame, Canvas  # Only the interactive display needs Tk
+
         self.action = None
-        Frame.__init__(self, master=Tk())
-        self.master.bind("<Key>", self.onkey)
-        self.master.attributes("-topmost", True)
-        self.canvas = Canvas(self, width=SCALE*COLS + 1, height=SCALE*ROWS + 1)
+        self.frame = Frame(master=Tk())
+        self.frame.master.bind("<Key>", self.onkey)
+        self.frame.master.attributes("-topmost", True)
+        self.canvas = Canvas(self.frame, width=SCALE*cols + 1, height=SCALE*rows + 1)
         self.canvas.pack()
-        self.pack()
+        self.frame.pack()
+
+        # Canvas items, created by setup
+        self.walls = None
+        self.items = dict()  # Item for each package and vehicle
+        self.platform_item = None
+        self.courier_item = None
+        self.platform_loads = list()
+        self.courier_loads = list()
 
     def onkey(self, event):
         """Allow keys to change the player's direction."""
@@ -178,25 +200,56 @@ class View(Frame):
             self.action = None
 
     def render(self, env):
-        """Display the given environment."""
+        """Display the given environment, drawing walls once and then moving the other items."""
+        if self.walls is not env.walls:
+            self.setup(env)
+
+        # Platform and courier, with their loads
+        self.canvas.coords(self.platform_item, *View.box(env.platform.location))
+        self.canvas.coords(self.courier_item, *View.box(env.courier.location))
+        View.stack(self.canvas, self.platform_loads, env.platform)
+        View.stack(self.canvas, self.courier_loads, env.courier)
+
+        # Packages stay put until collected, while vehicles move every step
+        current = set()
+        for package in env.packages:
+            if package not in self.items:
+                self.items[package] = self.canvas.create_rectangle(*View.box(package.location), fill="light blue")
+            current.add(package)
+        for vehicle in env.vehicles:
+            if vehicle in self.items:
+                self.canvas.coords(self.items[vehicle], *View.trapezoid(vehicle.location, vehicle.velocity))
+            else:
+                self.items[vehicle] = self.canvas.create_polygon(*View.trapezoid(vehicle.location, vehicle.velocity), fill="red")
+            current.add(vehicle)
+
+        # Remove collected packages and objects from earlier attempts
+        for obj in [obj for obj in self.items if obj not in current]:
+            self.canvas.delete(self.items.pop(obj))
+
+    def setup(self, env):
+        """Draw the walls of the given environment and create items for the platform and courier."""
         self.canvas.delete("all")
-        
+        self.items = dict()
+        self.walls = env.walls
+
         for location in env.walls:
             self.canvas.create_rectangle(*View.box(location), fill="black")
-        
-        self.canvas.create_rectangle(*View.box(env.platform.location), fill="white")
-        for i in range(env.platform.packages):
-            self.canvas.create_rectangle(*View.box(env.platform.location, i + 1), fill="light blue")
-        
-        self.canvas.create_oval(*View.box(env.courier.location), fill="yellow")
-        for i in range(env.courier.packages):
-            self.canvas.create_rectangle(*View.box(env.courier.location, i + 1), fill="light blue")
 
-        for package in env.packages:
-            self.canvas.create_rectangle(*View.box(package.location), fill="light blue")
+        self.platform_item = self.canvas.create_rectangle(*View.box(env.platform.location), fill="white")
+        self.platform_loads = [self.canvas.create_rectangle(0, 0, 0, 0, fill="light blue", state="hidden") for i in range(env.package_count)]
+        self.courier_item = self.canvas.create_oval(*View.box(env.courier.location), fill="yellow")
+        self.courier_loads = [self.canvas.create_rectangle(0, 0, 0, 0, fill="light blue", state="hidden") for i in range(env.package_count)]
 
-        for vehicle in env.vehicles:
-            self.canvas.create_polygon(*View.trapezoid(vehicle.location, vehicle.velocity), fill="red")
+    @staticmethod
+    def stack(canvas, loads, holder):
+        """Show one load item per package held by the given courier or platform, hiding the rest."""
+        for i, item in enumerate(loads):
+            if i < holder.packages:
+                canvas.coords(item, *View.box(holder.location, i + 1))
+                canvas.itemconfigure(item, state="normal")
+            else:
+                canvas.itemconfigure(item, state="hidden")
 
     @staticmethod
     def box(location, quadrant=ALL):
@@ -239,12 +292,80 @@ class View(Frame):
         return x1 + 1, y1 + 1, x2 - 1, y2 + 1, x3 - 1, y3 - 1, x4 + 1, y4 - 1
 
 
-class Task(TaskInterface):
+class Raster(object):
+    """Headless counterpart of View that draws environments into image arrays."""
+
     def __init__(self):
-        self.env = Environment()
-        self.current_events = set()
+        self.walls = None
+        self.background = None
+
+        # Pixels covered by each shape in a cell, taken from the coordinates that View draws
+        self.box = Raster.pixels(View.box((0, 0)))
+        self.oval = Raster.pixels(View.box((0, 0)), oval=True)
+        self.quadrants = [Raster.pixels(View.box((0, 0), quadrant)) for quadrant in (TOP_LEFT, TOP_RIGHT, BOTTOM_LEFT, BOTTOM_RIGHT)]
+        self.vehicles = {direction: Raster.pixels(View.trapezoid((0, 0), direction)) for direction in ("up", "down")}
+
+    def render(self, env):
+        """Return an RGB image of the given environment, drawing walls once."""
+        if self.walls is not env.walls:
+            self.walls = env.walls
+            self.background = np.empty((SCALE*env.rows + 1, SCALE*env.cols + 1, 3), dtype=np.uint8)
+            self.background[:] = BACKGROUND
+            Raster.stamp(self.background, self.box, list(env.walls), "black")
+        image = self.background.copy()
+
+        # Same order as the canvas items
+        Raster.stamp(image, self.box, [env.platform.location], "white")
+        for i in range(env.platform.packages):
+            Raster.stamp(image, self.quadrants[i % 4], [env.platform.location], "light blue")
+        Raster.stamp(image, self.oval, [env.courier.location], "yellow")
+        for i in range(env.courier.packages):
+            Raster.stamp(image, self.quadrants[i % 4], [env.courier.location], "light blue")
+        Raster.stamp(image, self.box, [package.location for package in env.packages], "light blue")
+        for direction, pixels in self.vehicles.items():
+            Raster.stamp(image, pixels, [vehicle.location for vehicle in env.vehicles if vehicle.velocity == direction], "red")
+        return image
+
+    @staticmethod
+    def pixels(coordinates, oval=False):
+        """Return row and column offsets of the pixels inside the given canvas shape in the top left cell."""
+        ys, xs = np.mgrid[0:SCALE + 1, 0:SCALE + 1] + 2.5  # Pixel centers in canvas coordinates
+        xy = np.array(coordinates, dtype=float).reshape(-1, 2)
+
+        if len(xy) == 2 and oval:
+            (x1, y1), (x2, y2) = xy
+            inside = ((2*xs - x1 - x2) / (x2 - x1))**2 + ((2*ys - y1 - y2) / (y2 - y1))**2 <= 1
+        elif len(xy) == 2:
+            (x1, y1), (x2, y2) = xy
+            inside = (x1 <= xs) & (xs <= x2) & (y1 <= ys) & (ys <= y2)
+        else:
+            # Convex polygon with clockwise corners on screen
+            inside = np.ones(xs.shape, dtype=bool)
+            for (x1, y1), (x2, y2) in zip(xy, np.roll(xy, -1, axis=0)):
+                inside &= (x2 - x1) * (ys - y1) - (y2 - y1) * (xs - x1) >= 0
+
+        return np.nonzero(inside)
+
+    @staticmethod
+    def stamp(image, pixels, locations, color):
+        """Fill the given shape at each of the given grid locations."""
+        if len(locations) == 0:
+            return
+        locations = np.array(locations).reshape(-1, 2)
+        image[SCALE*locations[:, :1] + pixels[0], SCALE*locations[:, 1:] + pixels[1]] = COLORS[color]
+
+
+class Task(TaskInterface):
+    def __init__(self, env=None):
+        self.env = Environment() if env is None else env
         TaskInterface.__init__(self)
 
+    def reset(self):
+        """Start a new attempt in the same environment."""
+        self.env.reset()
+        self.current_events = set()
+        TaskInterface.reset(self)
+
     def actions(self):
         """Return a set of action choices."""
         return {None, "up", "down", "left", "right"}
@@ -253,6 +374,15 @@ class Task(TaskInterface):
         """Perform the given action."""
         self.current_events = self.env.step(action)
 
+    @staticmethod
+    def perform_all(tasks, actions):
+        """Perform one action in each of the given tasks, stepping environments together when they share a batch."""
+        batch = getattr(tasks[0].env, "batch", None)
+        if batch is not None and all(getattr(task.env, "batch", None) is batch for task in tasks):
+            batch.perform(tasks, actions)
+        else:
+            TaskInterface.perform_all(tasks, actions)
+
     def objects(self):
         """Return a set of perceived objects."""
         return self.env.packages | self.env.vehicles | {self.env.platform, self.env.courier}
@@ -263,7 +393,7 @@ class Task(TaskInterface):
 
     def succeeded(self):
         """Return whether this attempt has succeeded."""
-        return self.env.platform.packages == PACKAGES
+        return self.env.platform.packages == self.env.package_count
 
     def failed(self):
         """Return whether this attempt has failed."""
@@ -283,7 +413,7 @@ class Task(TaskInterface):
 
     def demonstrate(self):
         """Allow a person to demonstrate this task."""
-        view = View()
+        view = View(self.env.rows, self.env.cols)
         view.render(self.env)
 
         # Perform actions on a timer
@@ -292,15 +422,15 @@ class Task(TaskInterface):
                 self.perform(view.action)
                 self.update()
                 view.render(self.env)
-                view.after(SLOW, tick)
+                view.frame.after(SLOW, tick)
 
-        view.after(SLOW, tick)
-        view.mainloop()
+        view.frame.after(SLOW, tick)
+        view.frame.mainloop()
 
     def display(self, agent):
         """Show the given agent attempting this task."""
         agent.prepare()
-        view = View()
+        view = View(self.env.rows, self.env.cols)
         view.render(self.env)
 
         # Perform actions on a timer
@@ -310,7 +440,27 @@ class Task(TaskInterface):
                 self.update()
                 agent.update(self)
                 view.render(self.env)
-                view.after(FAST, tick)
+                view.frame.after(FAST, tick)
+
+        view.frame.after(FAST, tick)
+        view.frame.mainloop()
 
-        view.after(FAST, tick)
-        view.mainloop()
+    def film(self, agent, filename, limit):
+        """Record the given agent attempting this task for at most the given number of steps without a display, as a GIF or as a directory of PNG images."""
+        frames = self.frames(agent, limit)
+        if filename.endswith(".gif"):
+            return write_gif(filename, frames, FAST)
+        else:
+            return write_sequence(filename, frames)
+
+    def frames(self, agent, limit):
+        """Generate images of the given agent attempting this task for at most the given number of steps."""
+        agent.prepare()
+        raster = Raster()
+        yield raster.render(self.env)
+
+        while not self.ended() and len(self.record) <= limit:
+            self.perform(agent.act(self))
+            self.update()
+            agent.update(self)
+            yield raster.render(self.env)
@@ -0,0 +1,15 @@
+"""Record a saved agent attempting Courier, without a display."""
+
+from pickle import load
+
+from courier import Task
+
+AGENT_FILE = "saved/agent.pkl"  # Created by train.py
+FILM_FILE = "saved/film"  # Created by this script, as PNG images or as a GIF if the name ends in .gif
+LIMIT = 10000  # Most steps to film
+
+f = open(AGENT_FILE, "rb")
+agent = load(f)
+f.close()
+
+print(Task().film(agent, FILM_FILE, LIMIT), "frames written to", FILM_FILE)
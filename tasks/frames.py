@@ -0,0 +1,154 @@
+"""Tools for recording and replaying emulator frames from the Atari tasks."""
+
+import numpy as np
+
+from time import perf_counter
+from random import seed
+
+
+class Recorder(object):
+    """Environment wrapper that records every step taken in an Atari environment."""
+
+    def __init__(self, env, seed=0):
+        self.env = env
+        self.unwrapped = env.unwrapped
+        self.seed = seed
+
+        # Step record
+        self.frames = list()
+        self.rams = list()
+        self.actions = list()
+        self.rewards = list()
+        self.lives = list()
+        self.dones = list()
+
+    def reset(self):
+        """Reset the wrapped environment."""
+        return self.env.reset()
+
+    def step(self, action):
+        """Take and record one step in the wrapped environment."""
+        observation, reward, done, info = self.env.step(action)
+        ale = self.env.unwrapped.ale
+        self.frames.append(observation if np.ndim(observation) == 3 else ale.getScreenRGB())
+        self.rams.append(ale.getRAM().copy())
+        self.actions.append(action)
+        self.rewards.append(reward)
+        self.lives.append(info["ale.lives"])
+        self.dones.append(done)
+        return observation, reward, done, info
+
+    def render(self):
+        """Render the wrapped environment."""
+        return self.env.render()
+
+    def close(self):
+        """Close the wrapped environment."""
+        self.env.close()
+
+    def save(self, filename):
+        """Save the recorded steps to a compressed archive."""
+        np.savez_compressed(
+            filename,
+            seed=self.seed,
+            frames=np.array(self.frames, dtype=np.uint8),
+            rams=np.array(self.rams, dtype=np.uint8),
+            actions=np.array(self.actions),
+            rewards=np.array(self.rewards),
+            lives=np.array(self.lives),
+            dones=np.array(self.dones))
+
+
+class Player(object):
+    """Stand-in for an Atari environment that plays back recorded steps, ignoring actions."""
+
+    def __init__(self, filename, ram=False):
+        archive = np.load(filename)
+        self.seed = int(archive["seed"])
+        self.frames = archive["frames"]
+        self.rams = archive["rams"]
+        self.actions = archive["actions"]
+        self.rewards = archive["rewards"]
+        self.lives_record = archive["lives"]
+        self.dones = archive["dones"]
+
+        # Observations match those of the recording environment unless memory is requested
+        self.observations = self.rams if ram else self.frames
+        self.position = 0
+        self.unwrapped = self
+        self.ale = self
+
+    def reset(self):
+        """Return a blank observation, since recordings begin after the reset."""
+        return np.zeros_like(self.observations[0])
+
+    def step(self, action):
+        """Play back one recorded step, raising EOFError once the recording is exhausted."""
+        if self.position >= len(self.observations):
+            raise EOFError("Recording exhausted after {} steps".format(len(self.observations)))
+        i = self.position
+        self.position += 1
+        return self.observations[i], self.rewards[i], self.dones[i], {"ale.lives": self.lives_record[i]}
+
+    def render(self):
+        """Skip rendering."""
+        pass
+
+    def close(self):
+        """Nothing to release."""
+        pass
+
+    def remaining(self):
+        """Return the number of recorded steps not yet played back."""
+        return len(self.observations) - self.position
+
+    def action(self):
+        """Return the recorded action for the next step."""
+        return self.actions[self.position]
+
+    def getRAM(self):
+        """Return the memory after the most recent step."""
+        return self.rams[max(0, self.position - 1)]
+
+    def getScreenRGB(self):
+        """Return the screen after the most recent step."""
+        return self.frames[max(0, self.position - 1)]
+
+    def getEpisodeFrameNumber(self):
+        """Return the number of steps played back."""
+        return self.position
+
+    def lives(self):
+        """Return the lives after the most recent step."""
+        return self.lives_record[max(0, self.position - 1)]
+
+
+def replay(task_generator, player, log_file=None, steps=4):
+    """Feed recorded steps through the perception of a task and return the frames per second."""
+    log = None if log_file is None else open(log_file, "w")
+    start = perf_counter()
+
+    # The recording seed reproduces the stochastic start
+    seed(player.seed)
+    task = task_generator(player)
+
+    while not task.ended() and player.remaining() >= steps:
+        try:
+            task.perform(player.action())
+            task.update()
+        except EOFError:
+            break  # Extra steps, such as waiting out a fall, ran past the end of the recording
+        if log is not None:
+            log.write(describe(task) + "\n")
+
+    elapsed = perf_counter() - start
+    if log is not None:
+        log.close()
+    return player.position / elapsed
+
+
+def describe(task):
+    """Return a line describing the tracked objects and events in the latest frame of a task."""
+    objects = sorted("{}@{}/{}".format(obj.type, tuple(int(v) for v in obj.location), obj.region) for obj in task.frame.objects)
+    events = sorted(str(event) for event in task.frame.events)
+    return "{}\t{}\t{}".format(len(task.record), " ".join(objects), " ".join(events))
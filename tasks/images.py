@@ -0,0 +1,51 @@
+"""Tools for writing rendered frames to image files without a display."""
+
+import os
+import struct
+import zlib
+
+import numpy as np
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None  # Only needed for GIFs
+
+
+def write_png(filename, image):
+    """Write an RGB image array to a PNG file using only the standard library."""
+    image = np.ascontiguousarray(image, dtype=np.uint8)
+    height, width = image.shape[:2]
+
+    # Each row starts with a filter type of zero
+    rows = np.zeros((height, 1 + 3 * width), dtype=np.uint8)
+    rows[:, 1:] = image.reshape(height, 3 * width)
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    f = open(filename, "wb")
+    f.write(b"\x89PNG\r\n\x1a\n")
+    f.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)))
+    f.write(chunk(b"IDAT", zlib.compress(rows.tobytes())))
+    f.write(chunk(b"IEND", b""))
+    f.close()
+
+
+def write_sequence(directory, frames):
+    """Write each of the given frames to a numbered PNG file in the given directory and return the number written."""
+    os.makedirs(directory, exist_ok=True)
+    count = 0
+    for frame in frames:
+        write_png(os.path.join(directory, "{:05d}.png".format(count)), frame)
+        count += 1
+    return count
+
+
+def write_gif(filename, frames, duration=50):
+    """Write the given frames to an animated GIF with the given milliseconds per frame, which requires Pillow."""
+    if Image is None:
+        raise ImportError("Writing GIFs requires Pillow; write a PNG sequence instead")
+    images = [Image.fromarray(np.asarray(frame, dtype=np.uint8)) for frame in frames]
+    images[0].save(filename, save_all=True, append_images=images[1:], duration=duration, loop=0)
+    return len(images)
@@ -7,17 +7,22 @@ from tasks.montezuma.montezuma import Task as OriginalTask
 
 
 class Joe(OriginalJoe):
-    def update(self, image):
+    def __init__(self):
+        """Override to start without falling."""
+        OriginalJoe.__init__(self)
+        self.falling = False
+
+    def move(self, x, y):
         """Override to replace velocity with fall tracking."""
-        OriginalJoe.update(self, image)
+        OriginalJoe.move(self, x, y)
         self.falling = self.velocity[1] > 0
         self.velocity = None
 
 
 class Task(OriginalTask):
-    def __init__(self):
+    def reset(self):
         """Override to replace Joe and track steps."""
-        OriginalTask.__init__(self)
+        OriginalTask.reset(self)
         self.joe = Joe()
         self.steps = 0
 
@@ -40,7 +45,7 @@ class Task(OriginalTask):
 
     def step(self, action, render=False, delay=0):
         """Take one step."""
-        image, reward, done, info = self.env.step(action)
+        observation, reward, done, info = self.env.step(action)
         if render:
             sleep(delay)
             self.env.render()
@@ -51,9 +56,7 @@ class Task(OriginalTask):
 
         # Update objects
         self.steps += 1
-        self.joe.update(image)
-        if self.steps % 4 == 0:
-            self.skull.update(image)
+        self.perceive(observation, skull=self.steps % 4 == 0)
 
     def length(self):
         """Override to keep timing comparable."""
@@ -1,18 +1,49 @@
 """Task defined in Montezuma's Revenge from OpenAI Gym."""
 
-import gym
-import pyglet
 import numpy as np
 
 from time import sleep
+from copy import deepcopy
 from random import randrange
 
 from rfd.task import TaskInterface
 from rfd.event import Object, Event
 
+try:
+    import pyglet
+except ImportError:
+    pyglet = None  # Only needed to demonstrate the task
+
 SLOW = 0.03  # Seconds between renders for playability
 FAST = 0.01  # Seconds between renders for watchability
 
+ENV_ID = "MontezumaRevengeNoFrameskip-v4"  # Environment with image observations
+RAM_ENV_ID = "MontezumaRevenge-ramNoFrameskip-v4"  # Environment with memory observations
+
+DELAYS = 100  # Number of possible stochastic start delays
+TRACKED = ["skull"]  # Attributes that change during the stochastic start
+STARTS = dict()  # Snapshots after each possible start delay, by perception backend
+
+# Lookup table bounds, covering the whole screen
+WIDTH = 160
+HEIGHT = 210
+
+# Perception backends
+PIXELS = "pixels"  # Find objects by their colors in rendered frames
+RAM = "ram"  # Read object coordinates from emulator memory, only when asked for despite the unconfirmed offsets below
+CHECK = "check"  # Find objects by their colors, but record disagreements with emulator memory
+
+# Emulator memory addresses
+JOE_X, JOE_Y = 42, 43
+SKULL_X, SKULL_Y = 47, 46
+
+# Unconfirmed estimates of screen coordinates of memory coordinates, as (x + X_OFFSET, Y_OFFSET - y)
+X_OFFSET = 2
+Y_OFFSET = 316
+
+REACH = 12  # Greatest distance from the skull at which a death counts as a collision, when sprite sizes are not available
+TOLERANCE = 4  # Greatest distance between backends that is not a disagreement
+
 
 class Joe(Object):
     def __init__(self):
@@ -25,10 +56,18 @@ class Joe(Object):
         if len(indices[0]) > 0:
             x = (np.amin(indices[1]) + np.amax(indices[1])) // 2
             y = 50 + (np.amin(indices[0]) + np.amax(indices[0])) // 2
-            self.velocity = (x - self.location[0], y - self.location[1])
-            self.region = Task.region((x, y))
             self.size = len(indices[0])
-            self.location = (x, y)
+            self.move(x, y)
+
+    def read(self, ram):
+        """Find Joe based on emulator memory."""
+        self.move(*Task.screen(ram[JOE_X], ram[JOE_Y]))
+
+    def move(self, x, y):
+        """Process new coordinates."""
+        self.velocity = (x - self.location[0], y - self.location[1])
+        self.region = Task.region((x, y))
+        self.location = (x, y)
 
 
 class Skull(Object):
@@ -42,13 +81,33 @@ class Skull(Object):
         if len(indices[0]) > 0:
             x = (np.amin(indices[1]) + np.amax(indices[1])) // 2
             y = 50 + (np.amin(indices[0]) + np.amax(indices[0])) // 2
-            self.velocity = (x - self.location[0], y - self.location[1])
-            self.location = (x, y)
+            self.move(x, y)
+
+    def read(self, ram):
+        """Find the skull based on emulator memory."""
+        self.move(*Task.screen(ram[SKULL_X], ram[SKULL_Y]))
+
+    def move(self, x, y):
+        """Process new coordinates."""
+        self.velocity = (x - self.location[0], y - self.location[1])
+        self.location = (x, y)
 
 
 class Task(TaskInterface):
-    def __init__(self):
-        self.env = gym.make("MontezumaRevengeNoFrameskip-v4")
+    def __init__(self, perception=PIXELS, env=None, cache=True, unconfirmed=False):
+        if perception == RAM and not unconfirmed:
+            raise ValueError("Memory offsets are unconfirmed; compare them with CHECK perception, then pass unconfirmed=True to perceive from memory")
+        self.perception = perception
+        if env is None:
+            import gym  # Only live play needs the emulator, not replaying recorded frames
+            env = gym.make(RAM_ENV_ID if perception == RAM else ENV_ID)
+        self.env = env
+        self.cache = cache
+        self.disagreements = list()
+        TaskInterface.__init__(self)
+
+    def reset(self):
+        """Start a new attempt in the same environment."""
         self.current_events = set()
         self.current_reward = 0
 
@@ -60,12 +119,41 @@ class Task(TaskInterface):
 
         # Stochastic start
         self.env.reset()
-        for delay in range(randrange(100)):
-            for step in range(4):
-                image, reward, done, info = self.env.step(0)
-                self.skull.update(image)
+        delay = randrange(DELAYS)
+        if self.cache:
+            if self.perception not in STARTS:
+                STARTS[self.perception] = self.starts()
+            self.restore(STARTS[self.perception][delay])
+        else:
+            self.wait(delay)
 
-        TaskInterface.__init__(self)
+        TaskInterface.reset(self)
+
+    def wait(self, delays):
+        """Take no actions for the given number of start delays."""
+        for delay in range(delays):
+            for step in range(4):
+                observation, reward, done, info = self.env.step(0)
+                self.perceive(observation, joe=False)
+
+    def starts(self):
+        """Return snapshots after every possible start delay."""
+        starts = list()
+        for delay in range(DELAYS):
+            starts.append(self.snapshot())
+            self.wait(1)
+        return starts
+
+    def snapshot(self):
+        """Return a copy of the emulator state and the tracked object state."""
+        return self.env.unwrapped.ale.cloneState(), deepcopy({name: getattr(self, name) for name in TRACKED})
+
+    def restore(self, snapshot):
+        """Return to the given emulator state and tracked object state."""
+        state, tracked = snapshot
+        self.env.unwrapped.ale.restoreState(state)
+        for name, value in deepcopy(tracked).items():
+            setattr(self, name, value)
 
     def actions(self):
         """Return a set of action choices."""
@@ -77,7 +165,7 @@ class Task(TaskInterface):
 
         # Take four steps
         for step in range(4):
-            image, reward, done, info = self.env.step(action)
+            observation, reward, done, info = self.env.step(action)
             if render:
                 sleep(delay)
                 self.env.render()
@@ -87,21 +175,14 @@ class Task(TaskInterface):
                 self.current_reward = reward
 
         # Update objects
-        self.joe.update(image)
-        self.skull.update(image)
+        self.perceive(observation)
 
     def update(self):
         """Override to process events after perform."""
         self.current_events = set()
 
-        # Disambiguate deaths
-        if self.joe.dead:
-            while self.joe.size > 50:
-                image, reward, done, info = self.env.step(0)
-                self.joe.update(image)
-
         # Detect falls
-        if self.joe.dead and self.joe.size > 20:
+        if self.joe.dead and self.fell():
             self.current_events.add(Event("falls", self.joe))
 
         # Detect collisions
@@ -154,6 +235,8 @@ class Task(TaskInterface):
 
     def demonstrate(self):
         """Allow a person to demonstrate this task."""
+        if pyglet is None:
+            raise ImportError("Demonstrating this task requires pyglet")
         self.env.render()
         self.action = 0
 
@@ -187,6 +270,64 @@ class Task(TaskInterface):
             agent.update(self)
         self.env.close()
 
+    def perceive(self, observation, joe=True, skull=True):
+        """Update objects from the given observation using the chosen perception backend."""
+        if self.perception == RAM:
+            if joe:
+                self.joe.read(observation)
+            if skull:
+                self.skull.read(observation)
+        else:
+            if joe:
+                self.joe.update(observation)
+            if skull:
+                self.skull.update(observation)
+            if self.perception == CHECK:
+                self.check(self.env.unwrapped.ale.getRAM(), joe, skull)
+
+    def fell(self):
+        """Return whether Joe died from a fall rather than a collision."""
+        # Memory holds no sprite sizes, so a death away from the skull counts as a fall, which misses collisions with
+        # anything else; CHECK mode records where this disagrees with the sprite sizes used otherwise
+        if self.perception == RAM:
+            return self.joe.distance(self.skull) > REACH
+
+        # Disambiguate by sprite size
+        while self.joe.size > 50:
+            image, reward, done, info = self.env.step(0)
+            self.joe.update(image)
+        fell = self.joe.size > 20
+
+        if self.perception == CHECK:
+            ram = self.env.unwrapped.ale.getRAM()
+            joe = Task.screen(ram[JOE_X], ram[JOE_Y])
+            skull = Task.screen(ram[SKULL_X], ram[SKULL_Y])
+            if fell != (Object("Joe", joe).distance(Object("Skull", skull)) > REACH):
+                self.disagree("fell", fell, not fell)
+
+        return fell
+
+    def check(self, ram, joe=True, skull=True):
+        """Record disagreements between object locations and emulator memory."""
+        locations = list()
+        if joe:
+            locations.append((self.joe, Task.screen(ram[JOE_X], ram[JOE_Y])))
+        if skull:
+            locations.append((self.skull, Task.screen(ram[SKULL_X], ram[SKULL_Y])))
+        for obj, location in locations:
+            if obj.distance(Object(obj.type, location)) > TOLERANCE:
+                self.disagree(obj.type, obj.location, location)
+
+    def disagree(self, name, pixels, ram):
+        """Record a disagreement between perception backends in the disagreements of this task."""
+        frame = self.env.unwrapped.ale.getEpisodeFrameNumber()
+        self.disagreements.append((frame, name, pixels, ram))
+
+    @staticmethod
+    def screen(x, y):
+        """Return screen coordinates for the given memory coordinates."""
+        return int(x) + X_OFFSET, Y_OFFSET - int(y)
+
     @staticmethod
     def act(symbol):
         """Return an action for the given key."""
@@ -211,6 +352,24 @@ class Task(TaskInterface):
     def region(location):
         """Return a region label for the given location."""
         x, y = location
+        if 0 <= x < WIDTH and 0 <= y < HEIGHT:
+            return REGIONS[REGION_TABLE[x, y]]
+        return Task.compute_region(location)
+
+    @staticmethod
+    def regions(xs, ys):
+        """Return region labels for many locations at once, given as arrays of coordinates."""
+        xs, ys = np.asarray(xs, dtype=int), np.asarray(ys, dtype=int)
+        inside = (0 <= xs) & (xs < WIDTH) & (0 <= ys) & (ys < HEIGHT)
+        labels = np.array(REGIONS, dtype=object)[REGION_TABLE[np.clip(xs, 0, WIDTH - 1), np.clip(ys, 0, HEIGHT - 1)]]
+        for k in np.flatnonzero(~inside):
+            labels[k] = Task.compute_region((xs[k], ys[k]))
+        return labels
+
+    @staticmethod
+    def compute_region(location):
+        """Return a region label for the given location by checking each boundary."""
+        x, y = location
         if y < 89:
             return "left-door" if x < 56 else "middle-platform" if x < 102 else "right-door"
         elif y < 124:
@@ -223,3 +382,19 @@ class Task(TaskInterface):
             return "left-ladder" if x < 32 else "floor" if x < 128 else "right-ladder"
         else:
             return "floor"
+
+
+def tabulate():
+    """Precompute region labels for every location on the screen."""
+    labels = list()
+    regions = np.zeros((WIDTH, HEIGHT), dtype=np.uint8)
+    for x in range(WIDTH):
+        for y in range(HEIGHT):
+            label = Task.compute_region((x, y))
+            if label not in labels:
+                labels.append(label)
+            regions[x, y] = labels.index(label)
+    return labels, regions
+
+
+REGIONS, REGION_TABLE = tabulate()
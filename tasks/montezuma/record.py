@@ -0,0 +1,28 @@
+"""Record the frames of a saved agent attempting Montezuma's Revenge."""
+
+import gym
+
+from pickle import load
+from random import seed
+
+from montezuma import Task, ENV_ID
+
+from tasks.frames import Recorder
+
+AGENT_FILE = "saved/agent.pkl"  # Created by train.py
+FRAMES_FILE = "saved/frames.npz"  # Created by this script
+
+SEED = 0  # Random seed, reused when replaying the frames
+
+f = open(AGENT_FILE, "rb")
+agent = load(f)
+f.close()
+
+seed(SEED)
+recorder = Recorder(gym.make(ENV_ID), SEED)
+task = Task(env=recorder, cache=False)  # Record the whole start
+agent.attempt(task)
+recorder.save(FRAMES_FILE)
+
+print("Length:", task.length())
+print("Frames:", len(recorder.frames))
@@ -0,0 +1,14 @@
+"""Replay recorded frames through the perception of Montezuma's Revenge."""
+
+from montezuma import Task, PIXELS, RAM
+
+from tasks.frames import Player, replay
+
+FRAMES_FILE = "saved/frames.npz"  # Created by record.py
+LOG_FILE = "saved/replay.txt"  # Created by this script, for diffing between implementations
+
+PERCEPTION = PIXELS  # Perception backend to exercise
+
+player = Player(FRAMES_FILE, ram=PERCEPTION == RAM)  # Memory observations for the memory backend
+fps = replay(lambda env: Task(PERCEPTION, env, cache=False), player, LOG_FILE)
+print("Frames per second:", round(fps))
@@ -1,18 +1,52 @@
 """Task defined in Ms. Pacman from OpenAI Gym."""
 
-import gym
-import pyglet
 import numpy as np
 
 from time import sleep
+from copy import deepcopy
 from random import randrange
 
 from rfd.task import TaskInterface
 from rfd.event import Object, Event
 
+try:
+    import pyglet
+except ImportError:
+    pyglet = None  # Only needed to demonstrate the task
+
 SLOW = 0.03  # Seconds between renders for playability
 FAST = 0.01  # Seconds between renders for watchability
 
+ENV_ID = "MsPacmanNoFrameskip-v4"
+
+INTRO = 266  # Length of the built-in delay
+DELAYS = 25  # Number of possible stochastic start delays
+TRACKED = ["pacman", "ghosts", "previous_ghosts", "powers", "slots", "image_buffer",
+           "current_events", "current_reward", "success_count", "lives"]  # Attributes that change during the start
+STARTS = dict()  # Snapshots after each possible start delay, by perception backend
+
+# Lookup table bounds, wide enough for sprites that wrap around the screen
+XMIN, XMAX = -16, 176
+YMIN, YMAX = 0, 176
+
+# Lookup table velocity classes
+HEADINGS = {None: 0, "up": 1, "down": 1, "left": 2, "right": 2}
+
+# Perception backends
+PIXELS = "pixels"  # Find sprites by their colors in rendered frames
+RAM = "ram"  # Read sprite coordinates from emulator memory, only when asked for despite the unconfirmed offsets below
+CHECK = "check"  # Find sprites by their colors, but record disagreements with emulator memory
+
+# Emulator memory addresses
+PACMAN_X, PACMAN_Y = 10, 16
+GHOSTS = [(6, 12, 180), (7, 13, 84), (8, 14, 198), (9, 15, 200)]  # Coordinate addresses and color of each ghost
+
+# Unconfirmed estimates of screen coordinates of memory coordinates, as (x + X_OFFSET, y + Y_OFFSET)
+X_OFFSET = -9
+Y_OFFSET = 6
+
+TOLERANCE = 4  # Greatest distance between backends that is not a disagreement
+
 
 class Pacman(Object):
     def __init__(self):
@@ -45,8 +79,21 @@ class Ghost(Object):
 
 
 class Task(TaskInterface):
-    def __init__(self):
-        self.env = gym.make("MsPacmanNoFrameskip-v4")
+    def __init__(self, perception=PIXELS, env=None, cache=True, unconfirmed=False):
+        if perception == RAM and not unconfirmed:
+            raise ValueError("Memory offsets are unconfirmed; compare them with CHECK perception, then pass unconfirmed=True to perceive from memory")
+        self.perception = perception
+        if env is None:
+            import gym  # Only live play needs the emulator, not replaying recorded frames
+            env = gym.make(ENV_ID)
+        self.env = env
+        self.cache = cache
+        self.disagreements = list()
+        TaskInterface.__init__(self)
+
+    def reset(self):
+        """Start a new attempt in the same environment."""
+        self.slots = [None] * len(GHOSTS)
         self.previous_ghosts = set()
         self.current_events = set()
         self.image_buffer = list()
@@ -68,16 +115,45 @@ class Task(TaskInterface):
             Object("Power", (149, 149), region=Task.region((149, 149)))
         }
 
-        # Built-in delay
+        # Built-in delay and stochastic start
         self.env.reset()
-        for step in range(266):
-            self.env.step(0)
+        delay = randrange(DELAYS)
+        if self.cache:
+            if self.perception not in STARTS:
+                STARTS[self.perception] = self.starts()
+            self.restore(STARTS[self.perception][delay])
+        else:
+            self.intro()
+            for step in range(delay):
+                self.perform(0)
+
+        TaskInterface.reset(self)
 
-        # Stochastic start
-        for delay in range(randrange(25)):
+    def intro(self):
+        """Wait out the built-in delay."""
+        for step in range(INTRO):
+            self.env.step(0)
+        self.lives = self.env.unwrapped.ale.lives()
+
+    def starts(self):
+        """Return snapshots after the built-in delay and every possible start delay."""
+        self.intro()
+        starts = list()
+        for delay in range(DELAYS):
+            starts.append(self.snapshot())
             self.perform(0)
+        return starts
 
-        TaskInterface.__init__(self)
+    def snapshot(self):
+        """Return a copy of the emulator state and the tracked object state."""
+        return self.env.unwrapped.ale.cloneState(), deepcopy({name: getattr(self, name) for name in TRACKED})
+
+    def restore(self, snapshot):
+        """Return to the given emulator state and tracked object state."""
+        state, tracked = snapshot
+        self.env.unwrapped.ale.restoreState(state)
+        for name, value in deepcopy(tracked).items():
+            setattr(self, name, value)
 
     def actions(self):
         """Return a set of action choices."""
@@ -102,7 +178,12 @@ class Task(TaskInterface):
 
         # Update objects
         self.image_buffer = self.image_buffer[-5:]
-        self.analyze()
+        if self.perception == RAM:
+            self.read(self.env.unwrapped.ale.getRAM())
+        else:
+            self.analyze()
+            if self.perception == CHECK:
+                self.check(self.env.unwrapped.ale.getRAM())
 
         # Detect death
         if self.pacman.dead:
@@ -157,6 +238,8 @@ class Task(TaskInterface):
 
     def demonstrate(self):
         """Allow a person to demonstrate this task."""
+        if pyglet is None:
+            raise ImportError("Demonstrating this task requires pyglet")
         self.env.render()
         self.action = 3
 
@@ -281,6 +364,73 @@ class Task(TaskInterface):
         if len(self.ghosts) == 0:
             self.pacman.dead = True
 
+    def read(self, ram):
+        """Find sprites based on emulator memory."""
+        self.previous_ghosts = self.ghosts
+        self.ghosts = set()
+
+        # Find pacman
+        x, y = Task.snap(*Task.screen(ram[PACMAN_X], ram[PACMAN_Y]))
+        self.pacman.update(x, y)
+
+        # Find ghosts, typing each by the sprite near its location
+        for slot, (ram_x, ram_y, color) in enumerate(GHOSTS):
+            x, y = Task.snap(*Task.screen(ram[ram_x], ram[ram_y]))
+            object_type = self.inspect(x, y, color)
+            ghost = self.slots[slot]
+
+            # Keep existing ghosts of the same type
+            if object_type is None:
+                ghost = None
+            elif ghost is not None and ghost.type == object_type:
+                ghost.update(Object(object_type, (x, y)))
+            else:
+                ghost = Ghost((x, y), 66 if object_type == "Edible" else color, small=object_type == "Eyes")
+
+            self.slots[slot] = ghost
+            if ghost is not None:
+                self.ghosts.add(ghost)
+
+        # Detect death
+        if self.env.unwrapped.ale.lives() < self.lives:
+            self.pacman.dead = True
+
+    def inspect(self, x, y, color):
+        """Return the type of ghost sprite near the given location in the image buffer, if any."""
+        for img in reversed(self.image_buffer):
+            patch = img[max(0, y - 8):min(172, y + 8), max(0, x - 6):min(160, x + 6), 0]
+            count = np.count_nonzero(patch == color)
+            if count > 0:
+                return "Eyes" if count < 20 else "Ghost"
+            elif np.any((patch == 66) | (patch == 214)):
+                return "Edible"
+        return None
+
+    def check(self, ram):
+        """Record disagreements between sprite locations and emulator memory."""
+        location = Task.snap(*Task.screen(ram[PACMAN_X], ram[PACMAN_Y]))
+        if not self.pacman.dead and self.pacman.distance(Object("Pacman", location)) > TOLERANCE:
+            self.disagree("Pacman", self.pacman.location, location)
+
+        for ram_x, ram_y, color in GHOSTS:
+            location = Task.snap(*Task.screen(ram[ram_x], ram[ram_y]))
+            for ghost in self.ghosts:
+                if ghost.color == color and ghost.distance(Object("Ghost", location)) > TOLERANCE:
+                    self.disagree("Ghost " + str(color), ghost.location, location)
+
+        if self.pacman.dead != (self.env.unwrapped.ale.lives() < self.lives):
+            self.disagree("dead", self.pacman.dead, not self.pacman.dead)
+
+    def disagree(self, name, pixels, ram):
+        """Record a disagreement between perception backends in the disagreements of this task."""
+        frame = self.env.unwrapped.ale.getEpisodeFrameNumber()
+        self.disagreements.append((frame, name, pixels, ram))
+
+    @staticmethod
+    def screen(x, y):
+        """Return screen coordinates for the given memory coordinates."""
+        return int(x) + X_OFFSET, int(y) + Y_OFFSET
+
     @staticmethod
     def act(symbol):
         """Return an action for the given key."""
@@ -327,6 +477,45 @@ class Task(TaskInterface):
     @staticmethod
     def snap(x, y):
         """Clean up locations by snapping them to corridors when possible."""
+        if XMIN <= x < XMAX and YMIN <= y < YMAX:
+            return x + int(SNAP_TABLE[0, x - XMIN, y - YMIN]), y + int(SNAP_TABLE[1, x - XMIN, y - YMIN])
+        return Task.compute_snap(x, y)
+
+    @staticmethod
+    def snaps(xs, ys):
+        """Snap many locations at once, given as arrays of coordinates."""
+        xs, ys = np.asarray(xs, dtype=int), np.asarray(ys, dtype=int)
+        inside = (XMIN <= xs) & (xs < XMAX) & (YMIN <= ys) & (ys < YMAX)
+        i, j = np.clip(xs - XMIN, 0, XMAX - XMIN - 1), np.clip(ys - YMIN, 0, YMAX - YMIN - 1)
+        snapped_xs, snapped_ys = xs + SNAP_TABLE[0, i, j], ys + SNAP_TABLE[1, i, j]
+        for k in np.flatnonzero(~inside):
+            snapped_xs[k], snapped_ys[k] = Task.compute_snap(xs[k], ys[k])
+        return snapped_xs, snapped_ys
+
+    @staticmethod
+    def region(location, velocity=None):
+        """Return a region label for the given location and velocity."""
+        x, y = location
+        if XMIN <= x < XMAX and YMIN <= y < YMAX:
+            return REGIONS[REGION_TABLE[HEADINGS[velocity], x - XMIN, y - YMIN]]
+        return Task.compute_region(location, velocity)
+
+    @staticmethod
+    def regions(xs, ys, velocities=None):
+        """Return region labels for many locations and velocities at once, given as arrays."""
+        xs, ys = np.asarray(xs, dtype=int), np.asarray(ys, dtype=int)
+        velocities = [None] * len(xs) if velocities is None else velocities
+        headings = np.array([HEADINGS[velocity] for velocity in velocities], dtype=int)
+        inside = (XMIN <= xs) & (xs < XMAX) & (YMIN <= ys) & (ys < YMAX)
+        i, j = np.clip(xs - XMIN, 0, XMAX - XMIN - 1), np.clip(ys - YMIN, 0, YMAX - YMIN - 1)
+        labels = np.array(REGIONS, dtype=object)[REGION_TABLE[headings, i, j]]
+        for k in np.flatnonzero(~inside):
+            labels[k] = Task.compute_region((xs[k], ys[k]), velocities[k])
+        return labels
+
+    @staticmethod
+    def compute_snap(x, y):
+        """Snap a location to corridors by checking the corridor coordinates directly."""
         horizontals = {9, 17, 33, 49, 57, 65, 93, 101, 109, 125, 141, 149}
         verticals = {7, 31, 55, 79, 103, 127, 139, 163}
 
@@ -346,8 +535,8 @@ class Task(TaskInterface):
             return x, y
 
     @staticmethod
-    def region(location, velocity=None):
-        """Return a region label for the given location and velocity."""
+    def compute_region(location, velocity=None):
+        """Return a region label for the given location and velocity by checking each corridor."""
         x, y = location
 
         # Vertical corridors
@@ -391,3 +580,27 @@ class Task(TaskInterface):
             if y == 139 and 49 <= x <= 65: return "H7a"
             if y == 139 and 93 <= x <= 109: return "H7b"
             if y == 163 and 9 <= x <= 149: return "H8"
+
+
+def tabulate():
+    """Precompute region labels and snap offsets for every location in the lookup table bounds."""
+    labels = [None]
+    regions = np.zeros((3, XMAX - XMIN, YMAX - YMIN), dtype=np.uint8)
+    snaps = np.zeros((2, XMAX - XMIN, YMAX - YMIN), dtype=np.int8)
+
+    for x in range(XMIN, XMAX):
+        for y in range(YMIN, YMAX):
+            sx, sy = Task.compute_snap(x, y)
+            snaps[:, x - XMIN, y - YMIN] = sx - x, sy - y
+
+            # One velocity per class
+            for velocity in (None, "up", "left"):
+                label = Task.compute_region((x, y), velocity)
+                if label not in labels:
+                    labels.append(label)
+                regions[HEADINGS[velocity], x - XMIN, y - YMIN] = labels.index(label)
+
+    return labels, regions, snaps
+
+
+REGIONS, REGION_TABLE, SNAP_TABLE = tabulate()
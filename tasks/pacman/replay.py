@@ -0,0 +1,14 @@
+"""Replay recorded frames through the perception of Ms. Pacman."""
+
+from pacman import Task, PIXELS
+
+from tasks.frames import Player, replay
+
+FRAMES_FILE = "saved/frames.npz"  # Created by record.py
+LOG_FILE = "saved/replay.txt"  # Created by this script, for diffing between implementations
+
+PERCEPTION = PIXELS  # Perception backend to exercise
+
+player = Player(FRAMES_FILE)
+fps = replay(lambda env: Task(PERCEPTION, env, cache=False), player, LOG_FILE)
+print("Frames per second:", round(fps))
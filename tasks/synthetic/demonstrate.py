@@ -0,0 +1,10 @@
+"""Create and save a scripted demonstration of the synthetic task."""
+
+from synthetic import Environment, Task
+
+DEMO_FILE = "saved/demo.pkl"  # Created by this script
+PLACEMENT = 0  # Seed for placing objects, so that the same demonstration is created each time
+
+task = Task(Environment(placement=PLACEMENT))
+task.demonstrate()
+task.save(DEMO_FILE)
@@ -0,0 +1,9 @@
+"""Show a saved agent attempting the synthetic task."""
+
+from synthetic import Task
+
+from rfd.procedures import display
+
+AGENT_FILE = "saved/agent.pkl"  # Created by train.py
+
+display(lambda: Task(), AGENT_FILE)
@@ -0,0 +1,35 @@
+"""Measure agent runtime and memory as the synthetic task grows."""
+
+from pickle import dumps
+from time import perf_counter
+
+from synthetic import Environment, Task
+
+from rfd.agent import Agent
+from rfd.procedures import run
+
+SIZES = [4, 9, 16, 36, 64]  # Numbers of regions, with one extra doorway per region
+DEPTH = 2  # Causal chain depth at every size
+BRANCHING = 2  # Causal chain branching at every size
+
+ATTEMPTS = 30  # Attempts timed at each size
+
+print("{:<10}{:<10}{:<10}{:<12}{:<12}{:<10}".format("Regions", "Score", "Steps", "us/step", "Bytes", "States"))
+for regions in SIZES:
+    env = Environment(regions, 2 * regions, depth=DEPTH, branching=BRANCHING)
+    demo = Task(env)
+    demo.demonstrate()
+
+    agent = Agent()
+    agent.observe(demo.record)
+
+    steps = 0
+    score = 0
+    start = perf_counter()
+    for attempt, task in run(agent, lambda: Task(env), ATTEMPTS):
+        steps += task.length()
+        score += task.score()
+    elapsed = perf_counter() - start
+
+    states = sum(len(q.q) for policies in (agent.routes, agent.tactics, agent.reflexes) for q in policies.values())
+    print("{:<10}{:<10}{:<10}{:<12.1f}{:<12}{:<10}".format(regions, round(score / ATTEMPTS, 2), steps, 1e6 * elapsed / steps, len(dumps(agent)), states))
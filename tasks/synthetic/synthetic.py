@@ -0,0 +1,305 @@
+"""Task with adjustable size and causal structure, in which a player triggers a chain of appearances to reach a goal."""
+
+from collections import deque
+from math import ceil, sqrt
+from random import Random, getrandbits
+
+from rfd.task import TaskInterface
+from rfd.event import Event, Object
+
+# Layout
+REGIONS = 9  # Rooms
+ENTRANCES = 10  # Doorways between neighboring rooms, at least enough to connect them all
+ROOM = 6  # Cells along each side of a room
+
+# Objects
+TYPES = 2  # Inert object types
+DEPTH = 2  # Appearances needed before the goal appears
+BRANCHING = 2  # Object types that make each type in the causal chain appear
+HAZARDS = 0.02  # Fraction of room cells holding a hazard
+
+LENGTH = 1000  # Steps before an attempt times out
+
+# Row and column changes for each action
+DELTAS = {None: (0, 0), "up": (-1, 0), "down": (1, 0), "left": (0, -1), "right": (0, 1)}
+
+
+class Environment(object):
+    """Grid of rooms joined by doorways, laid out once from a seed and repopulated for each attempt from another."""
+
+    def __init__(self, regions=REGIONS, entrances=ENTRANCES, types=TYPES, depth=DEPTH, branching=BRANCHING, hazards=HAZARDS, length=LENGTH, seed=0, placement=None):
+        self.region_count = regions
+        self.type_count = types
+        self.depth = depth
+        self.branching = branching
+        self.hazard_density = hazards
+        self.length = length
+        self.random = Random(getrandbits(64) if placement is None else placement)  # Places objects in each attempt
+
+        # Rooms in a grid, separated by walls one cell thick
+        self.room_cols = ceil(sqrt(regions))
+        self.room_rows = ceil(regions / self.room_cols)
+        self.rows = self.room_rows * (ROOM + 1) + 1
+        self.cols = self.room_cols * (ROOM + 1) + 1
+        self.regions = dict()  # Region of each open cell
+        for region in range(regions):
+            top, left = self.corner(region)
+            for row in range(top, top + ROOM):
+                for col in range(left, left + ROOM):
+                    self.regions[row, col] = region
+
+        # Doorways along a random spanning tree, then between further neighbors
+        generator = Random(seed)
+        pairs = list()
+        for region in range(regions):
+            if region % self.room_cols + 1 < self.room_cols and region + 1 < regions:
+                pairs.append((region, region + 1))
+            if region + self.room_cols < regions:
+                pairs.append((region, region + self.room_cols))
+        generator.shuffle(pairs)
+        groups = list(range(regions))
+        tree = list()
+        extra = list()
+        for a, b in pairs:
+            if find(groups, a) != find(groups, b):
+                groups[find(groups, a)] = find(groups, b)
+                tree.append((a, b))
+            else:
+                extra.append((a, b))
+        self.doorways = set()
+        for a, b in tree + extra[:max(0, entrances - len(tree))]:
+            self.doorways.add(self.doorway(a, b, generator))
+
+        # Causal chain, from the goal back to the types present at the start
+        self.causes = dict()  # Type that appears when each type is touched
+        levels = [["goal"]]
+        for level in range(depth):
+            levels.append([])
+            for effect in levels[-2]:
+                for j in range(branching):
+                    cause = effect.replace("goal", "item") + str(j)
+                    self.causes[cause] = effect
+                    levels[-1].append(cause)
+        self.starting_types = levels[-1] + ["thing" + str(j) for j in range(types)]
+
+        self.reset()
+
+    def corner(self, region):
+        """Return the top left cell of the given room."""
+        return (region // self.room_cols * (ROOM + 1) + 1, region % self.room_cols * (ROOM + 1) + 1)
+
+    def doorway(self, a, b, generator):
+        """Open the wall between the given neighboring rooms at a random cell, which belongs to the first room, and return it."""
+        top, left = self.corner(a)
+        offset = generator.randrange(ROOM)
+        if b == a + 1:
+            location = (top + offset, left + ROOM)
+        else:
+            location = (top + ROOM, left + offset)
+        self.regions[location] = a
+        return location
+
+    def reset(self):
+        """Place the player, items, inert things and hazards for a new attempt."""
+        rooms = [location for location in self.regions if location not in self.doorways]
+        hazards = int(self.hazard_density * len(rooms))
+        locations = self.random.sample(rooms, 1 + len(self.starting_types))
+
+        # Add hazards one at a time, skipping any cell that would cut the cells free of hazards apart
+        blocked = set()
+        for location in self.random.sample(rooms, len(rooms)):
+            if len(blocked) == hazards:
+                break
+            if location not in locations and not separates(self.regions, blocked, location):
+                blocked.add(location)
+        if len(blocked) < hazards:
+            raise ValueError("Cannot place {} hazards without cutting rooms apart; lower the hazard density".format(hazards))
+
+        self.player = Object("player", locations[0], self.regions[locations[0]])
+        self.items = {Object(object_type, location, self.regions[location]) for object_type, location in zip(self.starting_types, locations[1:])}
+        self.hazards = {Object("hazard", location, self.regions[location]) for location in blocked}
+        self.free = set(rooms) - set(locations) - blocked  # Where new items may appear
+        self.dead = False
+        self.finished = False
+
+    def step(self, action):
+        """Execute the given action and return a set of events."""
+        events = set()
+        delta = DELTAS[action]
+        location = (self.player.location[0] + delta[0], self.player.location[1] + delta[1])
+        if location in self.regions:
+            self.player.location = location
+            self.player.region = self.regions[location]
+
+        # Contact with hazards
+        for hazard in self.hazards:
+            if hazard.location == self.player.location:
+                events.add(Event("touches", self.player, hazard))
+                self.dead = True
+                return events
+
+        # Contact with items, each of which makes the next type in its chain appear
+        for item in list(self.items):
+            if item.location == self.player.location:
+                events.add(Event("touches", self.player, item))
+                if item.type == "goal":
+                    self.finished = True
+                elif item.type in self.causes:
+                    self.items.remove(item)
+                    self.free.add(item.location)
+                    location = self.random.choice(sorted(self.free - {self.player.location}))
+                    self.free.remove(location)
+                    self.items.add(Object(self.causes[item.type], location, self.regions[location]))
+
+        return events
+
+    def path(self, target, avoid=()):
+        """Return the first action on a shortest path from the player to the target location that avoids other hazards and the given objects, or None if there is none."""
+        blocked = {obj.location for obj in self.hazards | set(avoid)} - {target}
+        first = {self.player.location: None}
+        frontier = deque([self.player.location])
+        while len(frontier) > 0:
+            current = frontier.popleft()
+            if current == target:
+                return first[current]
+            for action in ("up", "down", "left", "right"):
+                delta = DELTAS[action]
+                following = (current[0] + delta[0], current[1] + delta[1])
+                if following in self.regions and following not in blocked and following not in first:
+                    first[following] = action if first[current] is None else first[current]
+                    frontier.append(following)
+        return None
+
+    def render(self):
+        """Return a text drawing of this environment."""
+        lines = [["#" if (row, col) not in self.regions else "." for col in range(self.cols)] for row in range(self.rows)]
+        for hazard in self.hazards:
+            lines[hazard.location[0]][hazard.location[1]] = "x"
+        for item in self.items:
+            lines[item.location[0]][item.location[1]] = "G" if item.type == "goal" else item.type[0]
+        lines[self.player.location[0]][self.player.location[1]] = "@"
+        return "\n".join("".join(line) for line in lines)
+
+
+class Task(TaskInterface):
+    def __init__(self, env=None):
+        self.env = Environment() if env is None else env
+        TaskInterface.__init__(self)
+
+    def reset(self):
+        """Start a new attempt in the same environment."""
+        self.env.reset()
+        self.current_events = set()
+        TaskInterface.reset(self)
+
+    def actions(self):
+        """Return a set of action choices."""
+        return {None, "up", "down", "left", "right"}
+
+    def perform(self, action):
+        """Perform the given action."""
+        self.current_events = self.env.step(action)
+
+    def objects(self):
+        """Return a set of perceived objects."""
+        return self.env.items | self.env.hazards | {self.env.player}
+
+    def events(self):
+        """Return a set of perceived events."""
+        return self.current_events
+
+    def succeeded(self):
+        """Return whether this attempt has succeeded."""
+        return self.env.finished
+
+    def failed(self):
+        """Return whether this attempt has failed."""
+        return self.env.dead
+
+    def ended(self):
+        """Return whether this attempt has ended."""
+        return self.succeeded() or self.failed() or len(self.record) >= self.env.length
+
+    def score(self):
+        """Return a score for this attempt."""
+        return 1 if self.succeeded() else 0
+
+    def length(self):
+        """Return a length for this attempt."""
+        return len(self.record)
+
+    def demonstrate(self):
+        """Script a demonstration that touches an item of every type in the causal chain before the goal, followed by an attempt that ends on a hazard."""
+        record = list()
+
+        # Touch the nearest item of a type not yet touched, leaving the goal for last
+        touched = set()
+        target = None
+        while not self.ended():
+            if target not in self.env.items:
+                remaining = set(self.env.causes) - touched
+                items = [item for item in self.env.items if item.type in remaining]
+                if len(items) == 0 and len(remaining) > 0:
+                    items = [item for item in self.env.items if item.type in self.env.causes]
+                if len(items) == 0:
+                    items = [item for item in self.env.items if item.type == "goal"]
+                target = min(items, key=self.env.player.distance)
+
+            # Prefer a path that does not touch other items on the way, or at least not a goal
+            goals = [item for item in self.env.items if item.type == "goal"]
+            actions = (self.env.path(target.location, avoid) for avoid in (self.env.items, goals, ()))
+            self.perform(next((action for action in actions if action is not None), None))
+            self.update()
+            touched |= {event.subject.type for event in self.frame.events}
+        record += self.record
+
+        # Walk into the nearest hazard
+        if len(self.env.hazards) > 0:
+            self.reset()
+            target = min(self.env.hazards, key=self.env.player.distance)
+            while not self.ended():
+                self.perform(self.env.path(target.location))
+                self.update()
+            record += self.record
+
+        self.record = record
+
+    def display(self, agent):
+        """Show the given agent attempting this task, as text."""
+        agent.prepare()
+        print(self.env.render())
+        while not self.ended():
+            self.perform(agent.act(self, verbose=True))
+            self.update()
+            agent.update(self)
+            print(self.env.render())
+            print()
+
+
+def separates(cells, blocked, cell):
+    """Return whether blocking the given cell could cut apart its open neighbors, judged only by open cells around it."""
+    around = {(cell[0] + dr, cell[1] + dc) for dr in (-1, 0, 1) for dc in (-1, 0, 1)} - {cell}
+    around = {location for location in around if location in cells and location not in blocked}
+    neighbors = [(cell[0] + delta[0], cell[1] + delta[1]) for delta in DELTAS.values() if delta != (0, 0)]
+    neighbors = [location for location in neighbors if location in around]
+    if len(neighbors) <= 1:
+        return False
+
+    # Neighbors joined through the ring of cells around this one stay joined without it
+    seen = {neighbors[0]}
+    frontier = [neighbors[0]]
+    while len(frontier) > 0:
+        current = frontier.pop()
+        for delta in DELTAS.values():
+            following = (current[0] + delta[0], current[1] + delta[1])
+            if following in around and following not in seen:
+                seen.add(following)
+                frontier.append(following)
+    return any(location not in seen for location in neighbors)
+
+
+def find(groups, region):
+    """Return the representative of the given region's group."""
+    while groups[region] != region:
+        region = groups[region]
+    return region
@@ -1,14 +1,17 @@
 """Tools for imitation learning in Taxi."""
 
-import gym
+import numpy as np
 
 from random import random, choice
 
 from rfd.qfunction import QFunction
 
+from tasks.taxi.simulator import Simulator, BatchSimulator
+
 # Taxi environment
-ENV = gym.make('Taxi-v2')
+ENV = Simulator()
 ACTIONS = [0, 1, 2, 3, 4, 5]
+BATCH = 1  # Taxis driven at once while training
 
 # Learning parameters
 ALPHA = 0.1
@@ -57,46 +60,70 @@ class Driver(object):
             s = Driver.state(obs, decompose=False)
             sd = Driver.state(obs, decompose=True)
 
-    def train(self, demos=None, decompose=False):
-        """Produce a learning curve."""
+    def train(self, demos=None, decompose=False, batch=BATCH):
+        """Produce a learning curve, driving the given number of taxis at once."""
         length = 0
         scores = list()
 
-        # Begin an episode
-        for episode in range(EPISODES):
-            score = 0
-            done = False
-            obs = ENV.reset()
-            s = Driver.state(obs, decompose)
-
-            # Choose an action
-            while not done:
-                if random() < self.epsilon:
-                    action = choice(ACTIONS)
-                elif demos is not None and s in demos:
-                    action = demos[s]
-                else:
-                    action = self.exploit(s)
-                
-                # Perform the action
-                obs, reward, done, info = ENV.step(action)
-                sp = Driver.state(obs, decompose)
-                score += reward
-                length += 1
-                
-                # Learn from it
-                if done:
-                    self.policy.update(s, action, reward)
-                    self.epsilon = max(EPSILON_MIN, self.epsilon * EPSILON_DECAY)
-                else:
-                    self.policy.update(s, action, reward, sp, ACTIONS)
-                    s = sp
-
-            # Add to the curve
-            scores.append(score)
-            if episode % FREQ == 0:
-                average = sum(scores[-WINDOW:]) / len(scores[-WINDOW:])
-                self.curve.append((length, average))
+        # Begin a batch of episodes
+        env = BatchSimulator(batch)
+        started = batch
+        active = [True] * batch
+        totals = [0] * batch
+        states = [Driver.state(int(obs), decompose) for obs in env.reset()]
+
+        while len(scores) < EPISODES:
+
+            # Choose actions, leaving finished taxis idle so that they draw no random numbers
+            actions = [self.choose(s, demos) if active[i] else 0 for i, s in enumerate(states)]
+
+            # Perform them
+            observations, rewards, dones, info = env.step(np.array(actions))
+            restarts = np.zeros(batch, dtype=bool)
+
+            for i in range(batch):
+                if active[i]:
+                    s, action, reward = states[i], actions[i], int(rewards[i])
+                    sp = Driver.state(int(observations[i]), decompose)
+                    totals[i] += reward
+                    length += 1
+
+                    # Learn from it
+                    if dones[i]:
+                        self.policy.update(s, action, reward)
+                        self.epsilon = max(EPSILON_MIN, self.epsilon * EPSILON_DECAY)
+                    else:
+                        self.policy.update(s, action, reward, sp, ACTIONS)
+                        states[i] = sp
+
+                    # Add to the curve
+                    if dones[i]:
+                        scores.append(totals[i])
+                        if (len(scores) - 1) % FREQ == 0:
+                            average = sum(scores[-WINDOW:]) / len(scores[-WINDOW:])
+                            self.curve.append((length, average))
+
+                        # Begin another episode
+                        totals[i] = 0
+                        if started < EPISODES:
+                            restarts[i] = True
+                            started += 1
+                        else:
+                            active[i] = False
+
+            if restarts.any():
+                observations = env.reset(restarts)
+                for i in np.flatnonzero(restarts):
+                    states[i] = Driver.state(int(observations[i]), decompose)
+
+    def choose(self, s, demos=None):
+        """Return an exploratory, demonstrated or exploit action for the given state."""
+        if random() < self.epsilon:
+            return choice(ACTIONS)
+        elif demos is not None and s in demos:
+            return demos[s]
+        else:
+            return self.exploit(s)
 
     @staticmethod
     def state(obs, decompose=False):
@@ -0,0 +1,160 @@
+"""Simulator with the dynamics of Taxi-v2 from OpenAI Gym, backed by precomputed tables."""
+
+import numpy as np
+
+from random import choice
+
+# Layout, in which a colon is a gap and a bar is a wall
+MAP = [
+    "+---------+",
+    "|R: | : :G|",
+    "| : : : : |",
+    "| : : : : |",
+    "| | : | : |",
+    "|Y| : |B: |",
+    "+---------+",
+]
+
+ROWS = 5
+COLS = 5
+STOPS = [(0, 0), (0, 4), (4, 0), (4, 3)]  # R, G, Y, B
+STATES = ROWS * COLS * (len(STOPS) + 1) * len(STOPS)
+ACTIONS = 6
+LIMIT = 200  # Steps before an episode times out
+
+
+def encode(row, col, passenger, destination):
+    """Return the state number for the given taxi row and column, passenger stop and destination stop."""
+    return ((row * COLS + col) * (len(STOPS) + 1) + passenger) * len(STOPS) + destination
+
+
+def decode(state):
+    """Return the taxi row and column, passenger stop and destination stop for the given state number."""
+    state, destination = divmod(state, len(STOPS))
+    state, passenger = divmod(state, len(STOPS) + 1)
+    row, col = divmod(state, COLS)
+    return row, col, passenger, destination
+
+
+def transition(state, action):
+    """Return the next state, reward and completion for the given state and action."""
+    row, col, passenger, destination = decode(state)
+    reward = -1
+    done = False
+
+    # Movement
+    if action == 0:
+        row = min(row + 1, ROWS - 1)
+    elif action == 1:
+        row = max(row - 1, 0)
+    elif action == 2 and MAP[1 + row][2 * col + 2] == ":":
+        col = min(col + 1, COLS - 1)
+    elif action == 3 and MAP[1 + row][2 * col] == ":":
+        col = max(col - 1, 0)
+
+    # Pickup
+    elif action == 4:
+        if passenger < len(STOPS) and (row, col) == STOPS[passenger]:
+            passenger = len(STOPS)
+        else:
+            reward = -10
+
+    # Dropoff
+    elif action == 5:
+        if passenger == len(STOPS) and (row, col) == STOPS[destination]:
+            passenger = destination
+            reward = 20
+            done = True
+        elif passenger == len(STOPS) and (row, col) in STOPS:
+            passenger = STOPS.index((row, col))
+        else:
+            reward = -10
+
+    return encode(row, col, passenger, destination), reward, done
+
+
+def tabulate():
+    """Precompute transitions, rewards and completions for every state and action."""
+    following = np.zeros((STATES, ACTIONS), dtype=np.int64)
+    rewards = np.zeros((STATES, ACTIONS), dtype=np.int64)
+    dones = np.zeros((STATES, ACTIONS), dtype=bool)
+    for state in range(STATES):
+        for action in range(ACTIONS):
+            following[state, action], rewards[state, action], dones[state, action] = transition(state, action)
+    return following, rewards, dones
+
+
+# Lookup tables, indexed by state and action
+NEXT, REWARD, DONE = tabulate()
+
+# Faster to index from Python one step at a time
+NEXT_LIST, REWARD_LIST, DONE_LIST = NEXT.tolist(), REWARD.tolist(), DONE.tolist()
+
+# Start with the passenger waiting somewhere other than the destination
+STARTS = [s for s in range(STATES) if decode(s)[2] < len(STOPS) and decode(s)[2] != decode(s)[3]]
+START_ARRAY = np.array(STARTS)
+
+
+class Simulator(object):
+    """Drop-in replacement for the Taxi-v2 environment."""
+
+    def __init__(self):
+        self.state = None
+        self.steps = 0
+
+    def reset(self):
+        """Start a new episode and return its state."""
+        self.state = choice(STARTS)
+        self.steps = 0
+        return self.state
+
+    def step(self, action):
+        """Take the given action and return the next state, reward, completion and an empty info dict."""
+        reward = REWARD_LIST[self.state][action]
+        done = DONE_LIST[self.state][action]
+        self.state = NEXT_LIST[self.state][action]
+        self.steps += 1
+        return self.state, reward, done or self.steps >= LIMIT, {}
+
+    def decode(self, state):
+        """Return the taxi row and column, passenger stop and destination stop for the given state."""
+        return decode(state)
+
+    def render(self):
+        """Print the map, marking the taxi with T, or with P if it has the passenger."""
+        row, col, passenger, destination = decode(self.state)
+        lines = [list(line) for line in MAP]
+        lines[1 + row][2 * col + 1] = "P" if passenger == len(STOPS) else "T"
+        print("\n".join("".join(line) for line in lines))
+        print("Passenger:", "in taxi" if passenger == len(STOPS) else "RGYB"[passenger], "Destination:", "RGYB"[destination])
+
+
+class BatchSimulator(object):
+    """Independent taxis stepped together through NumPy arrays."""
+
+    def __init__(self, n):
+        self.n = n
+        self.states = np.zeros(n, dtype=np.int64)
+        self.steps = np.zeros(n, dtype=np.int64)
+
+    def reset(self, mask=None):
+        """Start new episodes for all taxis, or for the taxis selected by the given mask, and return all states."""
+        mask = np.ones(self.n, dtype=bool) if mask is None else mask
+        self.states[mask] = START_ARRAY[np.random.randint(len(STARTS), size=np.count_nonzero(mask))]
+        self.steps[mask] = 0
+        return self.states.copy()
+
+    def step(self, actions):
+        """Take one action per taxi and return arrays of next states, rewards and completions, and an empty info dict."""
+        rewards = REWARD[self.states, actions]
+        dones = DONE[self.states, actions]
+        self.states = NEXT[self.states, actions]
+        self.steps += 1
+        return self.states.copy(), rewards, dones | (self.steps >= LIMIT), {}
+
+    def decode(self, states):
+        """Return arrays of taxi rows and columns, passenger stops and destination stops for the given states."""
+        states, destinations = np.divmod(states, len(STOPS))
+        states, passengers = np.divmod(states, len(STOPS) + 1)
+        rows, cols = np.divmod(states, COLS)
+        return rows, cols, passengers, destinations
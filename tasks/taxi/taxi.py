@@ -1,18 +1,23 @@
 """Task defined in Taxi from OpenAI Gym."""
 
-import gym
-
 from time import sleep
 
 from rfd.task import TaskInterface
 from rfd.event import Object, Event
 
+from tasks.taxi.simulator import Simulator
+
 DELAY = 1  # Seconds between renders
 
 
 class Task(TaskInterface):
-    def __init__(self):
-        self.env = gym.make("Taxi-v2")
+    def __init__(self, env=None):
+        """Use the built-in simulator unless given another environment, such as gym.make("Taxi-v2")."""
+        self.env = Simulator() if env is None else env
+        TaskInterface.__init__(self)
+
+    def reset(self):
+        """Start a new attempt in the same environment."""
         self.current_events = set()
         self.total_reward = 0
         self.success = False
@@ -25,7 +30,7 @@ class Task(TaskInterface):
         self.destination = Object("Destination", Task.locate(d), Task.region(d))
         self.stops = {Object("Stop", Task.locate(s), Task.region(s)) for s in {0, 1, 2, 3} - {p, d}}
 
-        TaskInterface.__init__(self)
+        TaskInterface.reset(self)
 
     def actions(self):
         """Return a set of action choices."""
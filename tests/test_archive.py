@@ -0,0 +1,56 @@
+"""Checks that agents saved in sections load with the same knowledge and values."""
+
+import pickle
+
+from rfd import archive
+from rfd.archive import MappedQFunction
+from rfd.benchmark import Scene, ACTIONS, ROOMS, LENGTH, trained
+
+
+def saved(tmp_path):
+    """Return an agent after a few attempts, and a copy of it saved in sections and loaded back."""
+    agent, scene = trained(4)
+    for seed in range(3):
+        agent.attempt(Scene(4, ROOMS, LENGTH, seed + 3))
+    filename = str(tmp_path / "agent.rfd")
+    agent.save(filename)
+    return agent, archive.load(filename)
+
+
+def test_round_trip(tmp_path):
+    """Every Q-value, the theory and the map survive saving and loading."""
+    agent, loaded = saved(tmp_path)
+    assert pickle.dumps(loaded.map.entrances) == pickle.dumps(agent.map.entrances)
+    assert loaded.theory.causes("SUCCESS") == agent.theory.causes("SUCCESS")
+    for policies in archive.POLICIES:
+        for template, q in getattr(agent, policies).items():
+            mapped = getattr(loaded, policies)[template]
+            assert isinstance(mapped, MappedQFunction)
+            for s in q.q:
+                assert mapped.values(s, ACTIONS) == q.values(s, ACTIONS)
+                assert [mapped.Q(s, a) for a in ACTIONS] == [q.Q(s, a) for a in ACTIONS]
+            assert mapped.values(("missing",), ACTIONS) == [0] * len(ACTIONS)
+            assert mapped.export().q == q.q
+
+
+def test_colliding_digests(tmp_path, monkeypatch):
+    """States whose digests collide still find their own rows, by their stored keys."""
+    monkeypatch.setattr(archive, "digest", lambda s: 1)
+    agent, loaded = saved(tmp_path)
+    for policies in archive.POLICIES:
+        for template, q in getattr(agent, policies).items():
+            mapped = getattr(loaded, policies)[template]
+            for s in q.q:
+                assert mapped.values(s, ACTIONS) == q.values(s, ACTIONS)
+            assert mapped.find(("missing",)) == -1
+
+
+def test_states_without_stored_keys(tmp_path):
+    """Tables from files that predate stored keys check rows against their pickled states."""
+    agent, loaded = saved(tmp_path)
+    for policies in archive.POLICIES:
+        for template, q in getattr(agent, policies).items():
+            mapped = getattr(loaded, policies)[template]
+            del mapped.entry["encoded"]
+            for s in q.q:
+                assert mapped.values(s, ACTIONS) == q.values(s, ACTIONS)
@@ -0,0 +1,116 @@
+"""Checks that a frozen agent chooses as the agent it was compiled from."""
+
+import random
+
+from itertools import product
+from random import Random
+
+from rfd import agent as live_agent, frozen as frozen_agent
+from rfd.agent import Agent, BETA_MAX
+from rfd.benchmark import Scene, ACTIONS, ROOMS, LENGTH, demonstration
+from rfd.event import Object, Event
+from rfd.frozen import FrozenAgent
+from rfd.search import Map
+
+HAZARDS = [2, 8]  # Hazards per scene, few enough for routes to decide actions or enough for risks to
+ATTEMPTS = 10  # Attempts an agent learns from before it is frozen
+
+
+def rank(option):
+    """Order actions as the benchmark lists them, ahead of objectives ordered by where they happen."""
+    return (0, ACTIONS.index(option)) if option in ACTIONS else (1, option.actor.location, option.subject.location)
+
+
+def chain(regions, clusters):
+    """Return an agent whose map is a chain of the given number of regions, grouped into clusters of the given size."""
+    agent = Agent(clusters=clusters)
+    for i in range(regions - 1):
+        location = (0, 10 * i + 10)
+        agent.map.connect((0, i), (0, i + 1), location)
+        agent.map.connect((0, i + 1), (0, i), location)
+    return agent
+
+
+def test_clustered_chain_routes():
+    """Every objective along a clustered chain is reachable, through the same checkpoint and at the same distance."""
+    agent = chain(7, 2)
+    frozen = FrozenAgent(agent, ACTIONS)
+    for start in range(7):
+        source = Object("player", (0, 10 * start + 5), (0, start))
+        for end in range(7):
+            target = Object("key", (0, 10 * end + 3), (0, end))
+            objective = Event("touches", source, target)
+            live = agent.map.search(source, {target})
+            compiled = frozen.search(source, {target})
+            assert compiled.found(target)
+            assert compiled.distance(target) == live.distance(target)
+            if start != end:
+                assert compiled.checkpoint(objective) == live.checkpoint(objective)
+
+
+def test_clustered_scene_routes():
+    """A frozen clustered agent finds every objective of a scene as far away as the agent does, through a checkpoint on a shortest path."""
+    random.seed(0)
+    agent = Agent(clusters=2)
+    agent.observe(demonstration(4))
+    for seed in range(4):
+        agent.attempt(Scene(4, ROOMS, LENGTH, seed + 3))
+    frozen = FrozenAgent(agent, ACTIONS)
+
+    scene = Scene(4, ROOMS, LENGTH, 2)
+    checkpoints = 0
+    while not scene.ended():
+        for template in agent.theory.contributors("SUCCESS", scene.frame):
+            for objective in scene.frame.objectives(template):
+                source, target = objective.actor, objective.subject
+                live = agent.map.search(source, {target})
+                compiled = frozen.search(source, {target})
+                assert compiled.found(target) == live.found(target)
+                assert compiled.distance(target) == live.distance(target)
+                if live.found(target) and not objective.regional():
+                    entrance = compiled.checkpoint(objective).subject
+                    assert source.distance(entrance) + Map.search(agent.map, entrance, {target}).distance(target) == live.distance(target)
+                    checkpoints += 1
+        scene.perform(frozen.act(scene))
+        scene.update()
+    assert checkpoints > 0
+
+
+def test_greedy_actions(monkeypatch):
+    """Without exploration, and breaking ties with the same random draws, a frozen agent pursuing the same route or tactic as the agent takes the same action."""
+    draws = Random()
+    compared = 0
+    for hazards, seed in product(HAZARDS, range(3)):
+        random.seed(seed)
+        agent = Agent()
+        agent.observe(demonstration(4, seed=seed))
+        for attempt in range(ATTEMPTS):
+            agent.attempt(Scene(hazards, ROOMS, LENGTH, seed + attempt + 3))
+        for policies in (agent.routes, agent.tactics, agent.reflexes):
+            for q in policies.values():
+                q.epsilon, q.beta = 0.0, BETA_MAX
+        frozen = FrozenAgent(agent, ACTIONS)
+
+        with monkeypatch.context() as patch:
+            for module in (live_agent, frozen_agent):
+                patch.setattr(module, "choice", lambda options: draws.choice(sorted(options, key=rank)))
+                patch.setattr(module, "random", lambda: 0.5)
+            patch.setattr(live_agent, "BETA_DECAY", 1.0)
+            patch.setattr(live_agent, "EPSILON_MAX", 0.0)
+            scene = Scene(hazards, ROOMS, LENGTH, seed + 2)
+            while not scene.ended():
+                draws.seed(len(scene.record))
+                s = frozen.target(scene.frame, frozen.theory.contributors("SUCCESS", scene.frame))[1]
+                draws.seed(len(scene.record))
+                action = frozen.act(scene)
+                draws.seed(len(scene.record))
+                live = agent.act(scene)
+
+                # Equally short routes through different entrances may be broken differently, as checked above
+                pursued = agent.checkpoint if agent.checkpoint is not None else agent.objective
+                if s == (None if pursued is None else pursued.s):
+                    assert live == action
+                    compared += 1
+                scene.perform(action)
+                scene.update()
+    assert compared > 0
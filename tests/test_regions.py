@@ -0,0 +1,34 @@
+"""Checks that the region and snap lookup tables of the Atari tasks agree with checking each location directly."""
+
+import numpy as np
+
+from tasks.pacman import pacman
+from tasks.montezuma import montezuma
+
+MARGIN = 4  # Locations checked beyond each side of the lookup tables, where queries fall back to direct checks
+VELOCITIES = [None, "up", "down", "left", "right"]
+
+
+def test_pacman_tables():
+    """Every location and velocity in and around the Ms. Pacman tables has the region and snap it would have without them."""
+    Task = pacman.Task
+    xs, ys = np.meshgrid(range(pacman.XMIN - MARGIN, pacman.XMAX + MARGIN), range(pacman.YMIN - MARGIN, pacman.YMAX + MARGIN), indexing="ij")
+    xs, ys = xs.ravel(), ys.ravel()
+    for velocity in VELOCITIES:
+        expected = [Task.compute_region((x, y), velocity) for x, y in zip(xs.tolist(), ys.tolist())]
+        assert [Task.region((x, y), velocity) for x, y in zip(xs.tolist(), ys.tolist())] == expected
+        assert list(Task.regions(xs, ys, [velocity] * len(xs))) == expected
+    expected = [Task.compute_snap(x, y) for x, y in zip(xs.tolist(), ys.tolist())]
+    assert [Task.snap(x, y) for x, y in zip(xs.tolist(), ys.tolist())] == expected
+    snapped_xs, snapped_ys = Task.snaps(xs, ys)
+    assert list(zip(snapped_xs.tolist(), snapped_ys.tolist())) == expected
+
+
+def test_montezuma_table():
+    """Every location on and around the Montezuma's Revenge screen has the region it would have without the table."""
+    Task = montezuma.Task
+    xs, ys = np.meshgrid(range(-MARGIN, montezuma.WIDTH + MARGIN), range(-MARGIN, montezuma.HEIGHT + MARGIN), indexing="ij")
+    xs, ys = xs.ravel(), ys.ravel()
+    expected = [Task.compute_region((x, y)) for x, y in zip(xs.tolist(), ys.tolist())]
+    assert [Task.region((x, y)) for x, y in zip(xs.tolist(), ys.tolist())] == expected
+    assert list(Task.regions(xs, ys)) == expected
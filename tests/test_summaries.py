@@ -0,0 +1,104 @@
+"""Checks that merged summaries of demonstrations teach what watching them frame by frame does."""
+
+import pickle
+
+from rfd import parallel
+from rfd.benchmark import demonstration
+from rfd.search import Map, Passages
+from rfd.theory import Theory, Evidence
+
+SPLITS = [0, 1, 30, 49, 80]  # Frames at which the combined record is cut into separate demonstrations
+EXPERIENCES = [  # (causes, effects) pairs in which causes recur with fewer effects, and some effects are never explained
+    ({"a"}, {"x", "y"}),
+    ({"b"}, {"y"}),
+    ({"a", "c"}, {"x", "z"}),
+    ({"b"}, {"y", "z"}),
+    ({"c"}, {"z"}),
+    ({"a"}, {"x"}),
+    ({"d", "b"}, set()),
+    ({"d"}, {"w"}),
+    ({"a"}, {"x", "y"}),
+]
+
+
+def records():
+    """Return several demonstrations, cut at frames that fall both between and within the scenes they record."""
+    record = demonstration(4, seed=0) + demonstration(6, seed=5)
+    bounds = SPLITS + [len(record)]
+    return [record[start:end] for start, end in zip(bounds, bounds[1:])]
+
+
+def watched(records):
+    """Return a theory and a map updated with every frame of the given records in turn."""
+    theory, world = Theory(), Map()
+    for record in records:
+        for frame in record:
+            theory.update(frame)
+            world.update(frame)
+    return theory, world
+
+
+def adopted(evidence, passages):
+    """Return a theory and a map constructed from the given summaries."""
+    theory, world = Theory(), Map()
+    theory.adopt(evidence)
+    world.adopt(passages)
+    return theory, world
+
+
+def assert_same(learned, expected):
+    """Check that two theories and maps hold the same hypotheses and the same entrances, in the same order."""
+    assert learned[0].hypotheses == expected[0].hypotheses
+    assert learned[0].experienced == expected[0].experienced
+    assert pickle.dumps(learned[1].entrances) == pickle.dumps(expected[1].entrances)
+
+
+def test_merged_in_order():
+    """Summaries of separate demonstrations merged left to right teach what watching them one after another does."""
+    parts = records()
+    evidence, passages = Evidence(), Passages()
+    for record in parts:
+        part_evidence, part_passages = Evidence(), Passages()
+        part_evidence.observe(record)
+        part_passages.observe(record)
+        evidence = evidence.merge(part_evidence)
+        passages = passages.merge(part_passages)
+    assert_same(adopted(evidence, passages), watched(parts))
+
+
+def test_merged_groups():
+    """Merging is associative, so summaries may be merged in groups."""
+    parts = records()
+    summaries = [(Evidence(), Passages()) for record in parts]
+    for (evidence, passages), record in zip(summaries, parts):
+        evidence.observe(record)
+        passages.observe(record)
+    left = summaries[0][0].merge(summaries[1][0]).merge(summaries[2][0].merge(summaries[3][0]).merge(summaries[4][0]))
+    right = summaries[0][1].merge(summaries[1][1].merge(summaries[2][1])).merge(summaries[3][1].merge(summaries[4][1]))
+    assert_same(adopted(left, right), watched(parts))
+
+
+def test_contracted_experiences():
+    """Evidence merged from any split of a sequence of pairs removes the hypotheses that expanding and contracting with each pair would."""
+    expected = Theory()
+    for causes, effects in EXPERIENCES:
+        expected.expand(causes, effects)
+        expected.contract(causes, effects)
+    for split in range(len(EXPERIENCES) + 1):
+        for other in range(split, len(EXPERIENCES) + 1):
+            evidence = Evidence(EXPERIENCES[:split]).merge(Evidence(EXPERIENCES[split:other])).merge(Evidence(EXPERIENCES[other:]))
+            theory = Theory()
+            theory.adopt(evidence)
+            assert theory.hypotheses == expected.hypotheses
+            assert theory.experienced == expected.experienced
+
+
+def test_summarized_files(tmp_path):
+    """Demonstrations summarized from files, sequentially or by worker processes, teach what watching them in file order does."""
+    parts = records()
+    for i, record in enumerate(parts):
+        f = open(str(tmp_path / "demo{}.pkl".format(i)), "wb")
+        pickle.dump(record, f)
+        f.close()
+    for processes in (0, 2):
+        assert_same(adopted(*parallel.summarize(str(tmp_path / "demo*.pkl"), processes)), watched(parts))
@@ -0,0 +1,29 @@
+"""Checks that frames keep the regions and locations their objects had when recorded."""
+
+import pickle
+
+from rfd.benchmark import Scene, demonstration
+
+
+def layout(frame):
+    """Return the type, region and location of each object in the given frame, sorted."""
+    return sorted((obj.type, frame.regions[obj], frame.locations[obj]) for obj in frame.objects)
+
+
+def test_objects_moved_later():
+    """A frame read after its objects have moved on still has their recorded regions and locations."""
+    scene = Scene(8)
+    frame = scene.frame
+    recorded = sorted((obj.type, obj.region, obj.location) for obj in frame.objects)
+    for step in range(20):
+        scene.perform("right")
+        scene.update()
+    assert layout(frame) == recorded
+
+
+def test_pickled_record():
+    """Frames come back from pickling with each object paired with its own region and location."""
+    record = demonstration(4)
+    loaded = pickle.loads(pickle.dumps(record))
+    for frame, copy in zip(record, loaded):
+        assert layout(copy) == layout(frame)